@@ -0,0 +1,160 @@
+import argparse
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+from sweep import sweep
+
+
+# Least-squares fits of SIRModel's beta and gamma (and M if not given)
+# to observed I_n or R_n series, n = 1..T; NaN marks a missing value.
+# Each series is searched in (log R0, logit gamma, log M), R0 being
+# beta*N/gamma, which puts series of any size on the same footing:
+#   1. a population of random candidates over the given ranges,
+#   2. rounds of perturbations around the best one, shaped like the
+#      cloud of the best candidates, growing after a round that finds a
+#      better point and shrinking after one that does not.
+# Every candidate of every series in a batch is one run of a single
+# sweep() call; batches of series go to a process pool. Candidates the
+# model rejects, or whose run stops before T, never win.
+
+COLUMNS = {"I": 1, "R": 2}
+
+
+def to_parameters(x, n):
+    # (..., 3) search points -> beta, gamma, m
+    gamma = 1 / (1 + np.exp(-x[..., 1]))
+    return np.exp(x[..., 0])*gamma/n, gamma, np.exp(x[..., 2])
+
+
+def losses(x, n, observed, column):
+    # x: (series, candidates, 3); returns (series, candidates) sums of
+    # squared errors, inf for runs not reaching the end of the series
+    beta, gamma, m = to_parameters(x, n[:, None])
+    sir = sweep(n[:, None], m, beta, gamma, observed.shape[1])["sir"]
+    error = sir[column] - observed.T[:, :, None]
+    error = np.where(np.isnan(observed.T)[:, :, None], 0.0, error)
+    loss = (error**2).sum(axis=0)
+    return np.where(np.isnan(loss), np.inf, loss)
+
+
+def fit_batch(task):
+    (observed, n, m, column, population, rounds, round_size, r0_range,
+     gamma_range, m_range, seed) = task
+    rng = np.random.default_rng(seed)
+    k = len(observed)
+    # candidates, drawn uniformly in the search space
+    low = np.array([np.log(r0_range[0]),
+                    np.log(gamma_range[0] / (1 - gamma_range[0])), 0.0])
+    high = np.array([np.log(r0_range[1]),
+                     np.log(gamma_range[1] / (1 - gamma_range[1])), 0.0])
+    x = low + (high - low)*rng.random((k, population, 3))
+    if m is None:
+        log_m = np.log(m_range)
+        x[:, :, 2] = log_m[:, :1] + (log_m[:, 1:] - log_m[:, :1]) \
+            * rng.random((k, population))
+    else:
+        x[:, :, 2] = np.log(m)[:, None]
+    loss = losses(x, n, observed, column)
+    order = np.argsort(loss, axis=1)
+    best_x = x[np.arange(k), order[:, 0]]
+    best = loss[np.arange(k), order[:, 0]]
+    elite = x[np.arange(k)[:, None], order[:, :max(4, population // 50)]]
+    # steps follow the shape of the elite cloud, so that they run along
+    # the narrow valleys R0 and gamma form
+    centred = elite - elite.mean(axis=1, keepdims=True)
+    cov = np.einsum("kpi,kpj->kij", centred, centred) / elite.shape[1]
+    shape = np.linalg.cholesky(cov + 1e-6*np.eye(3))
+    if m is not None:
+        shape[:, 2] = shape[:, :, 2] = 0
+    scale = np.ones(k)
+    for _ in range(rounds):
+        steps = np.einsum("kij,kpj->kpi", shape,
+                          rng.standard_normal((k, round_size, 3)))
+        trial = best_x[:, None] + scale[:, None, None]*steps
+        trial_loss = losses(trial, n, observed, column)
+        j = trial_loss.argmin(axis=1)
+        found = trial_loss[np.arange(k), j] < best
+        best_x[found] = trial[found, j[found]]
+        best[found] = trial_loss[found, j[found]]
+        scale[found] *= 1.5
+        scale[~found] *= 0.6
+    beta, gamma, fitted_m = to_parameters(best_x, n)
+    return beta, gamma, fitted_m, best
+
+
+def fit(observed, n, m=None, series="I", population=2000, rounds=60,
+        round_size=64, r0_range=(0.1, 20.0), gamma_range=(0.01, 0.99),
+        m_range=None, seed=0, workers=1, batch_size=None):
+    # observed: (T,) or (series, T); n (and m, if known): a value or one
+    # per series. m_range (default 1 to N/10) bounds the first search
+    # for M. Returns a dict of beta, gamma, m and rmse (over the
+    # observed values), one per series.
+    single = np.ndim(observed) == 1
+    observed = np.atleast_2d(np.asarray(observed, dtype=np.float64))
+    k, steps = observed.shape
+    n = np.broadcast_to(np.asarray(n, dtype=np.float64), (k,)).copy()
+    if m is not None:
+        m = np.broadcast_to(np.asarray(m, dtype=np.float64), (k,)).copy()
+    if series not in COLUMNS:
+        raise Exception(
+            f"series must be one of {sorted(COLUMNS)}, but actually {series}")
+    if m_range is None:
+        m_range = np.stack([np.ones(k), np.maximum(n / 10, 1)], axis=1)
+    m_range = np.broadcast_to(np.asarray(m_range, dtype=np.float64), (k, 2))
+    if batch_size is None:
+        # about 2*10**7 trajectory values per sweep
+        batch_size = max(1, 2*10**7 // (3*steps*max(population, round_size)))
+    starts = range(0, k, batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    tasks = [
+        (observed[a:a+batch_size], n[a:a+batch_size],
+         None if m is None else m[a:a+batch_size], COLUMNS[series],
+         population, rounds, round_size, r0_range, gamma_range,
+         m_range[a:a+batch_size], batch_seed)
+        for a, batch_seed in zip(starts, seeds)]
+    if workers is None:
+        workers = os.cpu_count()
+    pool = Pool(workers) if workers > 1 and len(tasks) > 1 else None
+    try:
+        results = list(map(fit_batch, tasks) if pool is None
+                       else pool.map(fit_batch, tasks))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    beta, gamma, fitted_m, loss = (np.concatenate(a) for a in zip(*results))
+    counted = np.maximum((~np.isnan(observed)).sum(axis=1), 1)
+    result = {"beta": beta, "gamma": gamma, "m": fitted_m,
+              "rmse": np.sqrt(loss / counted)}
+    if single:
+        result = {key: value[0] for key, value in result.items()}
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fit beta, gamma and M back to noisy synthetic series.")
+    parser.add_argument("--series", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=60)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    n = rng.uniform(1e4, 1e6, args.series)
+    m = rng.uniform(1, 50, args.series)
+    gamma = rng.uniform(0.05, 0.5, args.series)
+    beta = rng.uniform(1.2, 4, args.series)*gamma/n
+    i = sweep(n, m, beta, gamma, args.steps)["sir"][1].T
+    observed = i * (1 + args.noise*rng.standard_normal(i.shape))
+    start = time.time()
+    result = fit(observed, n, workers=args.workers)
+    elapsed = time.time() - start
+    for name, true in (("beta", beta), ("gamma", gamma), ("m", m)):
+        error = np.abs(result[name] / true - 1)
+        print(f"{name:5s} relative error: median {np.median(error):.3f}, "
+              f"90% {np.quantile(error, 0.9):.3f}")
+    print(f"{args.series} series of {args.steps} steps in {elapsed:.1f}s")
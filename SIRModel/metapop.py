@@ -0,0 +1,205 @@
+import argparse
+import time
+
+import numpy as np
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None
+
+from sir_model import BetaIExcess, STOP_BETA_I, STOP_MAX_STEP
+
+
+# SIRModel over many regions. Mobility W[a, b] is the share of region
+# a's people staying in region b (rows sum to 1). Infected people mix
+# where they stay, so a susceptible of region a meets
+#   force_a = sum_b W[a, b] * sum_c W[c, b] * I_c,   i.e. W @ (W.T @ I)
+# infected, and each step is next_sir with beta*I_n replaced by
+# beta*force: two sparse products per step, memory in the number of
+# links. With W the identity every region is a separate SIRModel.
+# Without scipy the products are done with np.bincount on the links.
+
+
+class Mobility:
+    def __init__(self, rows, cols, weights, n_regions):
+        # links a -> b with weight W[a, b]; repeated links add up
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.n_regions = n_regions
+        if sparse is not None:
+            self.w = sparse.csr_matrix(
+                (self.weights, (self.rows, self.cols)),
+                shape=(n_regions, n_regions))
+            self.wt = self.w.T.tocsr()
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        # a dense array or a scipy sparse matrix
+        if sparse is not None and sparse.issparse(matrix):
+            coo = matrix.tocoo()
+            return cls(coo.row, coo.col, coo.data, matrix.shape[0])
+        matrix = np.asarray(matrix, dtype=np.float64)
+        rows, cols = np.nonzero(matrix)
+        return cls(rows, cols, matrix[rows, cols], len(matrix))
+
+    def spread(self, x):
+        # W @ x
+        if sparse is not None:
+            return self.w @ x
+        return np.bincount(self.rows, self.weights*x[self.cols],
+                           minlength=self.n_regions)
+
+    def gather(self, x):
+        # W.T @ x
+        if sparse is not None:
+            return self.wt @ x
+        return np.bincount(self.cols, self.weights*x[self.rows],
+                           minlength=self.n_regions)
+
+    def force(self, i):
+        return self.spread(self.gather(i))
+
+
+def commuting(n_regions, neighbours=8, stay=0.8, seed=0):
+    # a test network: everyone spends `stay` of the time at home and the
+    # rest evenly over `neighbours` random other regions
+    rng = np.random.default_rng(seed)
+    home = np.arange(n_regions)
+    away = (home[:, None] + rng.integers(
+        1, n_regions, size=(n_regions, neighbours))) % n_regions
+    rows = np.concatenate([home, np.repeat(home, neighbours)])
+    cols = np.concatenate([home, away.ravel()])
+    weights = np.concatenate([
+        np.full(n_regions, stay),
+        np.full(n_regions*neighbours, (1 - stay)/neighbours)])
+    return Mobility(rows, cols, weights, n_regions)
+
+
+class MetapopSIRModel:
+    def __init__(self, n, m, beta, gamma, mobility):
+        # n, m: per region; beta, gamma: scalars or per region
+        self.N = np.asarray(n, dtype=np.float64)
+        self.M = np.broadcast_to(
+            np.asarray(m, dtype=np.float64), self.N.shape).copy()
+        self.BETA = np.asarray(beta, dtype=np.float64)
+        self.GAMMA = np.asarray(gamma, dtype=np.float64)
+        self.mobility = mobility
+        if not (
+            (self.N.shape == (mobility.n_regions,))
+            and (self.N > 0).all() and (self.M >= 0).all()
+            and (0 < self.BETA).all() and (self.BETA < 1).all()
+            and (0 < self.GAMMA).all() and (self.GAMMA < 1).all()
+        ):
+            raise Exception(
+                "N > 0, M >= 0, 0 < beta < 1, 0 < gamma < 1 in each of "
+                f"the {mobility.n_regions} regions must be satisified"
+            )
+        excess = (self.BETA*mobility.force(self.M)).max()
+        if excess >= 1:
+            raise Exception(
+                "beta*force(M) < 1 must be satisified, but actually "
+                f"max(beta*force(M)) = {excess}"
+            )
+
+    @property
+    def initial_sir(self):
+        return self.N.copy(), self.M.copy(), np.zeros_like(self.N)
+
+    def next_sir(self, s_now, i_now, r_now):
+        pressure = self.BETA*self.mobility.force(i_now)
+        if (pressure >= 1).any():
+            raise BetaIExcess()
+        infected = pressure*s_now
+        recovered = self.GAMMA*i_now
+        return (s_now - infected, i_now + infected - recovered,
+                r_now + recovered)
+
+    def iter_sir(self, max_step=None):
+        # as SIRModel.iter_sir, with arrays over the regions; stops when
+        # beta*force >= 1 in any region
+        s, i, r = self.initial_sir
+        n = 1
+        while True:
+            yield s, i, r
+            if max_step is not None and n >= max_step:
+                return STOP_MAX_STEP
+            try:
+                s, i, r = self.next_sir(s, i, r)
+            except BetaIExcess:
+                return STOP_BETA_I
+            n += 1
+
+    def simulate(self, max_step, out=None):
+        # fills out (max_step, 3, regions); see SIRModel.simulate
+        if max_step < 1:
+            raise Exception(f"max_step must be >= 1, but actually {max_step}")
+        if out is None:
+            out = np.empty((max_step, 3, len(self.N)))
+        steps = self.iter_sir(max_step)
+        n = 0
+        while True:
+            try:
+                out[n] = next(steps)
+            except StopIteration as stop:
+                return {"sir": out[:n], "stop": stop.value}
+            n += 1
+
+
+def naive_sir(model, max_step):
+    # the same model region by region in plain Python, for comparison
+    links = [[] for _ in range(model.mobility.n_regions)]
+    for a, b, w in zip(model.mobility.rows.tolist(),
+                       model.mobility.cols.tolist(),
+                       model.mobility.weights.tolist()):
+        links[a].append((b, w))
+    beta = np.broadcast_to(model.BETA, model.N.shape).tolist()
+    gamma = np.broadcast_to(model.GAMMA, model.N.shape).tolist()
+    s, i, r = (list(x) for x in model.initial_sir)
+    for _ in range(max_step - 1):
+        present = [0.0]*len(s)
+        for a, out in enumerate(links):
+            for b, w in out:
+                present[b] += w*i[a]
+        pressure = []
+        for a, out in enumerate(links):
+            force = 0.0
+            for b, w in out:
+                force += w*present[b]
+            pressure.append(beta[a]*force)
+        if max(pressure) >= 1:
+            break
+        for a in range(len(s)):
+            infected = pressure[a]*s[a]
+            recovered = gamma[a]*i[a]
+            s[a], i[a], r[a] = (s[a] - infected, i[a] + infected - recovered,
+                                r[a] + recovered)
+    return np.array([s, i, r])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time a metapopulation SIR run against a plain loop.")
+    parser.add_argument("--regions", type=int, default=10000)
+    parser.add_argument("--neighbours", type=int, default=8)
+    parser.add_argument("--max-step", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mobility = commuting(args.regions, args.neighbours)
+    n = rng.integers(1000, 100000, args.regions)
+    m = np.where(rng.random(args.regions) < 0.01, 10, 0)
+    model = MetapopSIRModel(n, m, 2e-6, 0.2, mobility)
+    start = time.time()
+    final = None
+    for final in model.iter_sir(args.max_step):
+        pass
+    vectorized = time.time() - start
+    start = time.time()
+    naive = naive_sir(model, args.max_step)
+    loop = time.time() - start
+    print(f"{args.regions} regions x {args.max_step} steps "
+          f"({'scipy' if sparse is not None else 'bincount'}): "
+          f"{vectorized:.2f}s, per-region loop: {loop:.2f}s, "
+          f"max difference {np.abs(np.array(final) - naive).max():.2e}")
@@ -1,4 +1,9 @@
-import matplotlib.pyplot as plt
+import numpy as np
+
+
+# why a run ended
+STOP_MAX_STEP = "max_step"
+STOP_BETA_I = "beta*I_n >= 1"
 
 
 class SIRModel:
@@ -30,6 +35,39 @@ class SIRModel:
             raise BetaIExcess()
         return s_next, i_next, r_next
 
+    def iter_sir(self, max_step=None):
+        # yields S_n, I_n, R_n for n = 1, 2, ... up to max_step (no limit
+        # for None); stops where next_sir would raise BetaIExcess and
+        # returns the reason (the StopIteration value)
+        beta, gamma = self.BETA, self.GAMMA
+        s, i, r = self.initial_sir
+        n = 1
+        while True:
+            yield s, i, r
+            if max_step is not None and n >= max_step:
+                return STOP_MAX_STEP
+            if beta*i >= 1:
+                return STOP_BETA_I
+            s, i, r = s - beta*s*i, i + beta*s*i - gamma*i, r + gamma*i
+            n += 1
+
+    def simulate(self, max_step, out=None):
+        # fills out, a float64 (max_step, 3) array (allocated if not
+        # given), with the rows of iter_sir; returns the filled rows as
+        # "sir" with "stop", the reason the run ended
+        if max_step < 1:
+            raise Exception(f"max_step must be >= 1, but actually {max_step}")
+        if out is None:
+            out = np.empty((max_step, 3))
+        steps = self.iter_sir(max_step)
+        n = 0
+        while True:
+            try:
+                out[n] = next(steps)
+            except StopIteration as stop:
+                return {"sir": out[:n], "stop": stop.value}
+            n += 1
+
 
 def input_with_validation(input_msg, type_):
     while True:
@@ -60,32 +98,22 @@ if __name__ == "__main__":
             break
     
     model = SIRModel(N, M, BETA, GAMMA)
-    s, i, r = model.initial_sir
-    n_series = [1]
-    s_series = [s]
-    i_series = [i]
-    r_series = [r]
+    result = model.simulate(MAX_STEP)
+    if result["stop"] == STOP_BETA_I:
+        print(
+            "time stepping was stopped because "
+            "beta*I_n exceeded 1"
+        )
+    sir = result["sir"]
+    n_series = np.arange(1, len(sir)+1)
 
-    for n in range(2, MAX_STEP+1):
-        try:
-            s, i, r = model.next_sir(s, i, r)
-        except BetaIExcess:
-            print(
-                "time stepping was stopped because "
-                "beta*I_n exceeded 1"
-            )
-            break
-        else:
-            n_series.append(n)
-            s_series.append(s)
-            i_series.append(i)
-            r_series.append(r)
+    import matplotlib.pyplot as plt
 
     _, ax = plt.subplots()
 
-    ax.plot(n_series, s_series, label="S_n")
-    ax.plot(n_series, i_series, label="I_n")
-    ax.plot(n_series, r_series, label="R_n")
+    ax.plot(n_series, sir[:, 0], label="S_n")
+    ax.plot(n_series, sir[:, 1], label="I_n")
+    ax.plot(n_series, sir[:, 2], label="R_n")
     ax.legend()
 
     title_str = (
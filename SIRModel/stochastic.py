@@ -0,0 +1,142 @@
+import argparse
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+from sir_model import SIRModel
+
+
+# Chain-binomial SIR: in each step every susceptible is infected with
+# probability beta*I_n and every infected recovers with probability
+# gamma, so the mean step is next_sir's (as long as beta*I_n < 1; the
+# probability is capped at 1 beyond). S, I and R are whole people.
+#
+# Ensembles run in chunks on a process pool, each chunk with its own
+# stream spawned from one SeedSequence, so a seed gives the same bands
+# whatever the number of workers. Chunks only send back per-step
+# histograms of S, I and R, from which the quantile bands are read;
+# no trajectory is kept.
+
+
+class StochasticSIRModel(SIRModel):
+    def __init__(self, n, m, beta, gamma):
+        if n != int(n) or m != int(m):
+            raise Exception(
+                "N and M must be whole numbers, but actually "
+                f"(N, M) = ({n}, {m})"
+            )
+        super().__init__(int(n), int(m), beta, gamma)
+
+    def step(self, s, i, r, rng):
+        # one random step for arrays of runs
+        infected = rng.binomial(s, np.minimum(self.BETA*i, 1.0))
+        recovered = rng.binomial(i, self.GAMMA)
+        return s - infected, i + infected - recovered, r + recovered
+
+    def simulate_runs(self, max_step, runs, rng):
+        # (max_step, 3, runs) trajectories; for small ensembles
+        out = np.empty((max_step, 3, runs), dtype=np.int64)
+        s, i, r = (np.full(runs, v, dtype=np.int64)
+                   for v in self.initial_sir)
+        out[0] = s, i, r
+        for n in range(1, max_step):
+            s, i, r = self.step(s, i, r, rng)
+            out[n] = s, i, r
+        return out
+
+    def ensemble(self, max_step, runs, seed=0, q=(0.05, 0.5, 0.95),
+                 workers=None, chunk_size=1000, max_bins=1024):
+        # Returns a dict with
+        #   quantiles  (len(q), max_step, 3), the q quantiles of S_n, I_n
+        #              and R_n over the runs
+        #   mean       (max_step, 3)
+        # Counts are binned max_bins to the histogram at most (exact when
+        # N + M < max_bins), a quantile being the middle of its bin.
+        population = self.N + self.M
+        width = -(-(population + 1) // max_bins)
+        n_bins = -(-(population + 1) // width)
+        chunks = np.random.SeedSequence(seed).spawn(-(-runs // chunk_size))
+        tasks = [
+            (self.N, self.M, self.BETA, self.GAMMA, max_step,
+             min(chunk_size, runs - k*chunk_size), chunk, width, n_bins)
+            for k, chunk in enumerate(chunks)]
+        hist = np.zeros((max_step, 3, n_bins), dtype=np.int64)
+        total = np.zeros((max_step, 3), dtype=np.int64)
+        if workers is None:
+            workers = os.cpu_count()
+        pool = Pool(workers) if workers > 1 and len(tasks) > 1 else None
+        try:
+            results = map(run_chunk, tasks) if pool is None \
+                else pool.imap_unordered(run_chunk, tasks)
+            for chunk_hist, chunk_total in results:
+                hist += chunk_hist
+                total += chunk_total
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return {
+            "q": np.asarray(q),
+            "quantiles": histogram_quantiles(hist, q, width),
+            "mean": total / runs,
+            "runs": runs,
+        }
+
+
+def run_chunk(task):
+    # histograms (max_step, 3, n_bins) and sums (max_step, 3) of a chunk
+    n, m, beta, gamma, max_step, runs, seed, width, n_bins = task
+    model = StochasticSIRModel(n, m, beta, gamma)
+    rng = np.random.default_rng(seed)
+    hist = np.zeros((max_step, 3, n_bins), dtype=np.int64)
+    total = np.zeros((max_step, 3), dtype=np.int64)
+    offsets = np.arange(3)[:, None]*n_bins
+    s, i, r = (np.full(runs, v, dtype=np.int64) for v in model.initial_sir)
+    for step in range(max_step):
+        if step:
+            s, i, r = model.step(s, i, r, rng)
+        sir = np.stack([s, i, r])
+        hist[step] += np.bincount(
+            (sir // width + offsets).ravel(),
+            minlength=3*n_bins).reshape(3, n_bins)
+        total[step] += sir.sum(axis=1)
+    return hist, total
+
+
+def histogram_quantiles(hist, q, width=1):
+    # quantiles along the last axis of histograms of binned counts
+    cdf = np.cumsum(hist, axis=-1)
+    runs = cdf[..., -1:]
+    out = []
+    for p in np.atleast_1d(q):
+        # the first bin holding at least a fraction p of the runs
+        bins = (cdf < np.maximum(p*runs, 1)).sum(axis=-1)
+        out.append(bins*width + (width - 1)/2)
+    return np.stack(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Quantile bands of a chain-binomial SIR ensemble.")
+    parser.add_argument("n", type=int)
+    parser.add_argument("m", type=int)
+    parser.add_argument("beta", type=float)
+    parser.add_argument("gamma", type=float)
+    parser.add_argument("--max-step", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    model = StochasticSIRModel(args.n, args.m, args.beta, args.gamma)
+    start = time.time()
+    bands = model.ensemble(args.max_step, args.runs, args.seed,
+                           workers=args.workers)
+    print(f"{args.runs} runs in {time.time() - start:.1f}s")
+    print("    n   I_n 5%   I_n 50%   I_n 95%    mean")
+    low, mid, high = bands["quantiles"][:, :, 1]
+    for n in range(args.max_step):
+        print(f"{n+1:5d} {low[n]:8.0f} {mid[n]:9.0f} {high[n]:9.0f} "
+              f"{bands['mean'][n, 1]:8.1f}")
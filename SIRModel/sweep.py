@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+
+
+# Many SIRModel runs advanced side by side: one NumPy operation per step
+# for the whole parameter grid instead of one next_sir call per run.
+# A run stops, as next_sir raising BetaIExcess does, at the first step
+# where beta*I_n >= 1; its later rows are NaN. Parameter sets breaking
+# SIRModel's conditions are not run at all (valid is False, length 0).
+
+
+def grid(n, m, beta, gamma):
+    # every combination of the given values, as four flat arrays
+    axes = [np.atleast_1d(np.asarray(a, dtype=np.float64))
+            for a in (n, m, beta, gamma)]
+    return tuple(a.ravel() for a in np.meshgrid(*axes, indexing="ij"))
+
+
+def valid_parameters(n, m, beta, gamma):
+    # SIRModel's conditions, elementwise
+    return ((n > 0) & (m > 0) & (0 < beta) & (beta < 1)
+            & (0 < gamma) & (gamma < 1) & (beta*m < 1))
+
+
+def sweep(n, m, beta, gamma, max_step, trajectories=True):
+    # Parameters broadcast against each other to the grid's shape. Returns
+    # a dict with
+    #   sir      (3, max_step) + shape, S_n, I_n, R_n for n = 1..max_step
+    #            (only with trajectories; NaN past the end of a run)
+    #   final    (3,) + shape, the last state of each run
+    #   length   how many steps each run has
+    #   stopped  runs stopped by beta*I_n >= 1
+    #   valid    runs whose parameters SIRModel accepts
+    if max_step < 1:
+        raise Exception(f"max_step must be >= 1, but actually {max_step}")
+    n, m, beta, gamma = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.float64) for a in (n, m, beta, gamma)))
+    shape = n.shape
+    n, m, beta, gamma = (a.ravel() for a in (n, m, beta, gamma))
+    valid = valid_parameters(n, m, beta, gamma)
+    nan = np.full(n.size, np.nan)
+    s = np.where(valid, n, nan)
+    i = np.where(valid, m, nan)
+    r = np.where(valid, 0.0, nan)
+    length = valid.astype(np.int64)
+    active = valid.copy()
+    sir = None
+    if trajectories:
+        sir = np.full((3, max_step, n.size), np.nan)
+        sir[:, 0] = s, i, r
+    infected = np.empty(n.size)
+    recovered = np.empty(n.size)
+    for step in range(1, max_step):
+        active &= beta*i < 1
+        if not active.any():
+            break
+        np.multiply(beta, s, out=infected)
+        infected *= i
+        np.multiply(gamma, i, out=recovered)
+        # stopped runs keep their last state
+        infected[~active] = 0
+        recovered[~active] = 0
+        s -= infected
+        i += infected
+        i -= recovered
+        r += recovered
+        length += active
+        if trajectories:
+            for row, values in zip(sir[:, step], (s, i, r)):
+                np.copyto(row, values, where=active)
+    result = {
+        "final": np.stack([s, i, r]).reshape((3,) + shape),
+        "length": length.reshape(shape),
+        "stopped": (valid & ~active).reshape(shape),
+        "valid": valid.reshape(shape),
+    }
+    if trajectories:
+        result["sir"] = sir.reshape((3, max_step) + shape)
+    return result
+
+
+if __name__ == "__main__":
+    # a 10**5 run grid, against next_sir's arithmetic one run at a time
+    n, m, beta, gamma = grid(
+        [1e4, 1e5], np.linspace(1, 50, 50),
+        np.linspace(1e-6, 2e-5, 40), np.linspace(0.05, 0.5, 25))
+    max_step = 100
+    start = time.time()
+    result = sweep(n, m, beta, gamma, max_step)
+    elapsed = time.time() - start
+    print(f"{n.size} runs x {max_step} steps: {elapsed:.2f}s, "
+          f"{result['stopped'].sum()} stopped by beta*I_n >= 1")
+
+    sample = 1000
+    start = time.time()
+    for k in range(sample):
+        s, i, r = n[k], m[k], 0.0
+        for _ in range(max_step - 1):
+            if beta[k]*i >= 1:
+                break
+            s, i, r = (s - beta[k]*s*i, i + beta[k]*s*i - gamma[k]*i,
+                       r + gamma[k]*i)
+    loop = (time.time() - start) * n.size / sample
+    print(f"one run at a time: {loop:.2f}s (estimated from {sample} runs)")
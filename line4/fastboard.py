@@ -0,0 +1,117 @@
+from itertools import permutations, product
+
+from line4 import Judge
+
+
+# Compact 4x4x4 position: one 64-bit mask per player, cell (x, y, z) at
+# bit (x*4 + y)*4 + z, so each pole is a nibble with its bottom cell in
+# the lowest bit. The side to move follows from the number of stones.
+
+def cell_bit(x, y, z):
+    return (x*4 + y)*4 + z
+
+
+def build_lines():
+    index_board = [
+        [[cell_bit(x, y, z) for z in range(4)] for y in range(4)]
+        for x in range(4)]
+    return [sum(1 << i for i in line)
+            for line in Judge().extract_lines(index_board)]
+
+
+def build_symmetries():
+    # the 8 of the cube's 48 symmetries that keep z (gravity) fixed,
+    # as permutations of the 16 poles
+    syms = []
+    for perm, flips in product(permutations(range(2)),
+                               product((False, True), repeat=2)):
+        pole_perm = []
+        for c in product(range(4), repeat=2):
+            nx, ny = (3-c[perm[i]] if flips[i] else c[perm[i]]
+                      for i in range(2))
+            pole_perm.append(nx*4 + ny)
+        syms.append(tuple(pole_perm))
+    return syms
+
+
+def build_byte_tables():
+    # BYTE_TABLES[s][k][b]: image under symmetry s of byte k (two poles)
+    # of a mask whose value is b, so a transform is 8 lookups
+    return [
+        [[transform(b << (8*k), perm) for b in range(256)]
+         for k in range(8)]
+        for perm in SYMMETRIES]
+
+
+def height(occupied, pole):
+    return ((occupied >> (pole*4)) & 0xF).bit_length()
+
+
+def stones(m0, m1):
+    return bin(m0 | m1).count("1")
+
+
+def transform(mask, perm):
+    new = 0
+    for p, q in enumerate(perm):
+        new |= ((mask >> (p*4)) & 0xF) << (q*4)
+    return new
+
+
+LINES = build_lines()
+CELL_LINES = [[m for m in LINES if m >> i & 1] for i in range(64)]
+SYMMETRIES = build_symmetries()
+BYTE_TABLES = build_byte_tables()
+# CELL_IMAGES[cell][s]: the bit of the image of cell under symmetry s
+CELL_IMAGES = [[transform(1 << i, perm) for perm in SYMMETRIES]
+               for i in range(64)]
+FULL = (1 << 64) - 1
+
+
+def canonical(m0, m1):
+    b0 = [(m0 >> (8*k)) & 0xFF for k in range(8)]
+    b1 = [(m1 >> (8*k)) & 0xFF for k in range(8)]
+    best = None
+    for t in BYTE_TABLES:
+        key = (t[0][b0[0]] | t[1][b0[1]] | t[2][b0[2]] | t[3][b0[3]] |
+               t[4][b0[4]] | t[5][b0[5]] | t[6][b0[6]] | t[7][b0[7]],
+               t[0][b1[0]] | t[1][b1[1]] | t[2][b1[2]] | t[3][b1[3]] |
+               t[4][b1[4]] | t[5][b1[5]] | t[6][b1[6]] | t[7][b1[7]])
+        if best is None or key < best:
+            best = key
+    return best
+
+
+def images(m0, m1):
+    # the position under every symmetry; canonical() is the smallest
+    b0 = [(m0 >> (8*k)) & 0xFF for k in range(8)]
+    b1 = [(m1 >> (8*k)) & 0xFF for k in range(8)]
+    return [(t[0][b0[0]] | t[1][b0[1]] | t[2][b0[2]] | t[3][b0[3]] |
+             t[4][b0[4]] | t[5][b0[5]] | t[6][b0[6]] | t[7][b0[7]],
+             t[0][b1[0]] | t[1][b1[1]] | t[2][b1[2]] | t[3][b1[3]] |
+             t[4][b1[4]] | t[5][b1[5]] | t[6][b1[6]] | t[7][b1[7]])
+            for t in BYTE_TABLES]
+
+
+def wins(mask, cell):
+    for line in CELL_LINES[cell]:
+        if mask & line == line:
+            return True
+    return False
+
+
+def moves(m0, m1):
+    # (pole, cell) for every pole that is not full
+    occupied = m0 | m1
+    return [(pole, pole*4 + h) for pole in range(16)
+            for h in (height(occupied, pole),) if h < 4]
+
+
+def play(m0, m1, cell):
+    # returns the masks after the side to move takes `cell`, and whether
+    # that completes a line
+    if stones(m0, m1) % 2 == 0:
+        m0 |= 1 << cell
+        return m0, m1, wins(m0, cell)
+    m1 |= 1 << cell
+    return m0, m1, wins(m1, cell)
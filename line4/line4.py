@@ -1,5 +1,39 @@
+from io import StringIO
 from itertools import product
-import numpy as np
+
+
+class TextRenderer(object):
+    # Layers from the top down, rows from y=3 down, columns by x; read
+    # through a cell(x, y, z) getter. lineN/render.py has the same
+    # interface (renderer(dim, ndim, players), touch, render) and its
+    # renderers can be set as Game.renderer_class.
+    empty = "."
+
+    def __init__(self, dim=4, ndim=3, players=()):
+        self.d = dim
+        self.width = max(
+            [len(self.empty)] + [len(str(p)) for p in players])
+        self.buf = StringIO()
+
+    def token(self, color):
+        text = self.empty if color is None else str(color)
+        return text.ljust(self.width)
+
+    def touch(self, pole):
+        pass
+
+    def render(self, cell):
+        buf = self.buf
+        buf.seek(0)
+        buf.truncate()
+        for z in range(self.d-1, -1, -1):
+            for y in range(self.d-1, -1, -1):
+                buf.write(" ".join(
+                    self.token(cell(x, y, z)) for x in range(self.d)))
+                buf.write("\n")
+            if z:
+                buf.write("\n")
+        return buf.getvalue().rstrip("\n")
 
 
 class Board(object):
@@ -101,9 +135,12 @@ class Judge(object):
 
         
 class Game(object):
+    renderer_class = TextRenderer
+
     def __init__(self, player1="BB", player2="WW"):
         self.b = Board()
         self.j = Judge()
+        self.renderer = self.renderer_class(4, 3, [player1, player2])
         self.finished = False
         self.turn = str(player1)
         self.dict_players = {
@@ -131,6 +168,8 @@ class Game(object):
         else:
             put = self.b.put_stone((x, y), self.turn)
             if put:
+                # the board takes negative indices too; poles by 0-3
+                self.renderer.touch((x % 4, y % 4))
                 print(self)
                 self.winner = self.j.winner(self.b.board)
                 if self.winner is not None:
@@ -156,13 +195,11 @@ class Game(object):
         "g.show()          : show this"
         print(explanation)
         
+    def cell(self, x, y, z):
+        return self.b.board[x][y][z]
+
     def __repr__(self):
-        v_board = [[[
-            self.b.board[x][y][z]
-            for x in range(4)]
-            for y in range(3, -1, -1)]
-            for z in range(3, -1, -1)]
-        return str(np.array(v_board))
+        return self.renderer.render(self.cell)
 
 if __name__ == "__main__":
     print("""
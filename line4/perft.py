@@ -0,0 +1,95 @@
+from multiprocessing import Pool
+import sys
+import time
+
+from fastboard import FULL, canonical, moves, play
+
+
+# Layer-by-layer enumeration of the 4x4x4 game tree. Each layer maps a
+# canonical position (itself a valid pair of masks) to the number of
+# move sequences reaching it, so transpositions and symmetric positions
+# are expanded once while the path counts stay exact.
+
+
+def expand(items):
+    # Expands positions of one layer. Returns the non-terminal children
+    # and the terminal ones, the latter as key -> [outcome, paths] with
+    # outcome 0 (first player won), 1 (second player won) or 2 (draw).
+    children = {}
+    terminals = {}
+    for (m0, m1), n in items:
+        mover = bin(m0 | m1).count("1") % 2
+        for _, cell in moves(m0, m1):
+            c0, c1, won = play(m0, m1, cell)
+            key = canonical(c0, c1)
+            if won or (c0 | c1) == FULL:
+                entry = terminals.setdefault(key, [mover if won else 2, 0])
+                entry[1] += n
+            else:
+                children[key] = children.get(key, 0) + n
+    return children, terminals
+
+
+def chunks(layer, n):
+    items = list(layer.items())
+    size = max(1, -(-len(items) // n))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def perft(max_depth, workers=1, report=None):
+    layer = {(0, 0): 1}
+    results = []
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for depth in range(1, max_depth + 1):
+            if not layer:
+                break
+            start = time.time()
+            if pool is None:
+                parts = [expand(layer.items())]
+            else:
+                parts = pool.map(expand, chunks(layer, workers*4))
+            nodes = len(layer)
+            layer = {}
+            terminals = {}
+            for children, part_terminals in parts:
+                for key, n in children.items():
+                    layer[key] = layer.get(key, 0) + n
+                for key, (outcome, n) in part_terminals.items():
+                    terminals.setdefault(key, [outcome, 0])[1] += n
+            unique = [0, 0, 0]
+            paths = [0, 0, 0]
+            for outcome, n in terminals.values():
+                unique[outcome] += 1
+                paths[outcome] += n
+            elapsed = time.time() - start
+            result = {
+                "depth": depth,
+                "positions": len(layer) + sum(unique),
+                "paths": sum(layer.values()) + sum(paths),
+                "terminal_positions": unique,
+                "terminal_paths": paths,
+                "seconds": elapsed,
+                "nps": nodes / max(elapsed, 1e-9),
+            }
+            results.append(result)
+            if report is not None:
+                report(result)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+
+def print_result(r):
+    print("depth {depth:2d}: {positions:>12,} positions {paths:>16,} "
+          "paths  wins {terminal_positions[0]:,}/"
+          "{terminal_positions[1]:,} draws {terminal_positions[2]:,}  "
+          "{nps:,.0f} expanded/s".format(**r))
+
+
+if __name__ == "__main__":
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    perft(max_depth, workers, print_result)
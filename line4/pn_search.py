@@ -0,0 +1,299 @@
+import argparse
+import os
+import pickle
+import time
+
+from fastboard import (
+    CELL_IMAGES, CELL_LINES, canonical, height, images, play, stones, wins)
+
+
+# Depth-first proof-number search (df-pn) on fastboard positions.
+#
+# The attacker is the side to move at the root. The goal "win" asks
+# whether it can force a line; "draw" whether it can avoid losing, so a
+# full board counts for it. Proof and disproof numbers are kept for the
+# attacker in a table keyed by canonical position; that table is all the
+# state of a search, so saving it is a checkpoint and loading it resumes
+# where the search stopped.
+INF = 1 << 40
+VERSION = 1
+
+
+class Stop(Exception):
+    pass
+
+
+def parse_moves(text):
+    # "00,12,33" -> [(0, 0), (1, 2), (3, 3)]
+    return [(int(m[0]), int(m[1])) for m in text.split(",") if m]
+
+
+def position(moves):
+    m0 = m1 = 0
+    for x, y in moves:
+        pole = x*4 + y
+        h = height(m0 | m1, pole)
+        if h == 4:
+            raise Exception("Pole ({}, {}) is full.".format(x, y))
+        m0, m1, won = play(m0, m1, pole*4 + h)
+        if won:
+            raise Exception("The game is already over.")
+    return m0, m1
+
+
+def child_key(imgs, cell, mover):
+    # canonical key after `mover` takes `cell`, from the images of the
+    # position before the move
+    if mover == 0:
+        return min((i0 | b, i1)
+                   for (i0, i1), b in zip(imgs, CELL_IMAGES[cell]))
+    return min((i0, i1 | b)
+               for (i0, i1), b in zip(imgs, CELL_IMAGES[cell]))
+
+
+def move_score(cell, mine, theirs, their_wins):
+    # threats first: lines the move brings to three stones, then lines
+    # still open for the mover; a move that opens a winning cell of the
+    # opponent right above it comes last
+    score = 0
+    for line in CELL_LINES[cell]:
+        if line & theirs:
+            continue
+        n = bin(line & mine).count("1")
+        score += 16 if n == 2 else 1 + n
+    if cell % 4 < 3 and cell + 1 in their_wins:
+        score -= 1000
+    return score
+
+
+def expand(m0, m1):
+    # (outcome, cells) for the side to move: outcome is "win", "loss"
+    # or "draw" when the position is decided without searching, else
+    # None and cells the moves worth trying, best first. An immediate
+    # threat of the opponent must be blocked, and two of them cannot be.
+    occupied = m0 | m1
+    if stones(m0, m1) % 2 == 0:
+        mine, theirs = m0, m1
+    else:
+        mine, theirs = m1, m0
+    their_wins = set()
+    cells = []
+    for pole in range(16):
+        h = height(occupied, pole)
+        if h < 4:
+            cell = pole*4 + h
+            if wins(mine | 1 << cell, cell):
+                return "win", None
+            cells.append(cell)
+            if wins(theirs | 1 << cell, cell):
+                their_wins.add(cell)
+    if not cells:
+        return "draw", None
+    if len(their_wins) > 1:
+        return "loss", None
+    if their_wins:
+        cells = list(their_wins)
+    else:
+        above = set(c + 1 for c in cells if c % 4 < 3)
+        their_next = set(
+            c for c in above if wins(theirs | 1 << c, c))
+        cells.sort(key=lambda c: -move_score(c, mine, theirs, their_next))
+    return None, cells
+
+
+class ProofSearch(object):
+    def __init__(self, m0=0, m1=0, goal="win", max_entries=1 << 24,
+                 epsilon=0.25, checkpoint=None, interval=600.0,
+                 max_nodes=None, time_limit=None, report=None):
+        if goal not in ("win", "draw"):
+            raise Exception("goal should be 'win' or 'draw'.")
+        self.root = (m0, m1)
+        self.goal = goal
+        self.attacker = stones(m0, m1) % 2
+        self.max_entries = max_entries
+        self.epsilon = epsilon
+        self.checkpoint = checkpoint
+        self.interval = interval
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.report = report
+        self.tt = {}
+        self.nodes = 0
+        self.seconds = 0.0
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.load(checkpoint)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state["version"] != VERSION or state["root"] != self.root \
+                or state["goal"] != self.goal:
+            raise Exception(
+                "{} belongs to another search.".format(path))
+        self.tt = state["tt"]
+        self.nodes = state["nodes"]
+        self.seconds = state["seconds"]
+
+    def save(self, path):
+        state = {
+            "version": VERSION, "root": self.root, "goal": self.goal,
+            "tt": self.tt, "nodes": self.nodes,
+            "seconds": self.seconds + time.time() - self.started,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def decided(self, outcome, m0, m1):
+        # (pn, dn) of a position whose outcome for the side to move is
+        # known
+        if outcome == "draw":
+            good = self.goal == "draw"
+        else:
+            good = (outcome == "win") == \
+                (stones(m0, m1) % 2 == self.attacker)
+        return (0, INF) if good else (INF, 0)
+
+    def collect(self):
+        # keeps the solved entries only; unsolved ones are rebuilt on
+        # demand
+        self.tt = {k: v for k, v in self.tt.items() if 0 in v}
+
+    def tick(self):
+        self.nodes += 1
+        if self.nodes % 10000:
+            return
+        now = time.time()
+        if len(self.tt) > self.max_entries:
+            self.collect()
+        if self.report is not None and self.nodes % 1000000 == 0:
+            self.report(self)
+        if self.checkpoint is not None and \
+                now - self.last_save > self.interval:
+            self.save(self.checkpoint)
+            self.last_save = now
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise Stop()
+        if self.deadline is not None and now > self.deadline:
+            raise Stop()
+
+    def mid(self, m0, m1, th_pn, th_dn):
+        self.tick()
+        imgs = images(m0, m1)
+        key = min(imgs)
+        outcome, cells = expand(m0, m1)
+        if outcome is not None:
+            self.tt[key] = self.decided(outcome, m0, m1)
+            return self.tt[key]
+        mover = stones(m0, m1) % 2
+        attacking = mover == self.attacker
+        children = [play(m0, m1, c)[:2] for c in cells]
+        keys = [child_key(imgs, c, mover) for c in cells]
+        while True:
+            entries = [self.tt.get(k, (1, 1)) for k in keys]
+            # phi is minimized over the children, delta summed: pn and
+            # dn at attacker nodes, the other way round elsewhere
+            if attacking:
+                phis = [e[0] for e in entries]
+                deltas = [e[1] for e in entries]
+                th_phi, th_delta = th_pn, th_dn
+            else:
+                phis = [e[1] for e in entries]
+                deltas = [e[0] for e in entries]
+                th_phi, th_delta = th_dn, th_pn
+            phi = min(phis)
+            delta = min(sum(deltas), INF)
+            pn, dn = (phi, delta) if attacking else (delta, phi)
+            if phi >= th_phi or delta >= th_delta:
+                break
+            best = phis.index(phi)
+            second = min(phis[:best] + phis[best+1:], default=INF)
+            # the chosen child may grow its minimized number up to (just
+            # past) the second best, and its summed one by our slack
+            th_min = min(th_phi, int(second*(1 + self.epsilon)) + 1)
+            th_sum = th_delta - delta + deltas[best]
+            if attacking:
+                self.mid(*children[best], th_min, th_sum)
+            else:
+                self.mid(*children[best], th_sum, th_min)
+        self.tt[key] = (pn, dn)
+        return pn, dn
+
+    def run(self):
+        # "proven", "disproven", or "unknown" when stopped by a limit
+        self.started = time.time()
+        self.last_save = self.started
+        self.deadline = None if self.time_limit is None \
+            else self.started + self.time_limit
+        try:
+            pn, dn = self.mid(*self.root, INF, INF)
+        except (Stop, KeyboardInterrupt):
+            pn, dn = self.tt.get(canonical(*self.root), (1, 1))
+        if self.checkpoint is not None:
+            self.save(self.checkpoint)
+        self.seconds += time.time() - self.started
+        if pn == 0:
+            return "proven"
+        if dn == 0:
+            return "disproven"
+        return "unknown"
+
+    def proof_move(self):
+        # an attacker move leading to a proven position, as (x, y)
+        outcome, cells = expand(*self.root)
+        if outcome is not None:
+            return None
+        for cell in cells:
+            c0, c1 = play(*self.root, cell)[:2]
+            if self.tt.get(canonical(c0, c1), (1, 1))[0] == 0:
+                return divmod(cell // 4, 4)
+        return None
+
+
+def print_progress(search):
+    print("{:>14,} nodes {:>12,} entries".format(
+        search.nodes, len(search.tt)), flush=True)
+
+
+def prove(moves, args, report=None):
+    m0, m1 = position(moves)
+    search = ProofSearch(
+        m0, m1, goal=args.goal, max_entries=args.max_entries,
+        checkpoint=args.checkpoint, interval=args.interval,
+        max_nodes=args.max_nodes, time_limit=args.time_limit,
+        report=report)
+    result = search.run()
+    return search, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Prove line4 positions with df-pn search.")
+    parser.add_argument(
+        "positions", nargs="*",
+        help="positions as move lists such as 00,12,33 (pole x then y);"
+             " none proves the empty board with checkpoints")
+    parser.add_argument("--goal", choices=["win", "draw"], default="win",
+                        help="what the side to move should achieve")
+    parser.add_argument("--checkpoint", default="line4_pn.pkl",
+                        help="checkpoint file of the empty-board search")
+    parser.add_argument("--interval", type=float, default=600.0,
+                        help="seconds between checkpoints")
+    parser.add_argument("--max-entries", type=int, default=1 << 24)
+    parser.add_argument("--max-nodes", type=int)
+    parser.add_argument("--time-limit", type=float)
+    args = parser.parse_args()
+
+    if not args.positions:
+        search, result = prove([], args, print_progress)
+        print("empty board, goal {}: {} ({:,} nodes, {:.0f}s)".format(
+            args.goal, result, search.nodes, search.seconds))
+    else:
+        args.checkpoint = None
+        for text in args.positions:
+            search, result = prove(parse_moves(text), args)
+            move = search.proof_move() if result == "proven" else None
+            print("{}: {} ({:,} nodes, {:.1f}s){}".format(
+                text, result, search.nodes, search.seconds,
+                "" if move is None else ", play {}".format(move)))
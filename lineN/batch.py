@@ -0,0 +1,74 @@
+from functools import lru_cache
+import numpy as np
+
+from lines import cell_line_table, line_table
+
+
+@lru_cache(maxsize=None)
+def padded_tables(dim):
+    # lines[n] holds the cells of line n; the extra last line points at
+    # the never-filled cell dim**3, so padding entries can never win.
+    n_cells = dim**3
+    lines = np.array(line_table(3, dim) + ((n_cells,)*dim,), dtype=np.intp)
+    width = max(map(len, cell_line_table(3, dim)))
+    through = np.full((n_cells, width), len(lines)-1, dtype=np.intp)
+    for i, ids in enumerate(cell_line_table(3, dim)):
+        through[i, :len(ids)] = ids
+    return lines, through
+
+
+def simulate_batch(n_games, dim, rng):
+    lines, through = padded_tables(dim)
+    n_cells, n_poles = dim**3, dim*dim
+    board = np.zeros((n_games, n_cells+1), dtype=np.int8)
+    heights = np.zeros((n_games, n_poles), dtype=np.intp)
+    winner = np.full(n_games, -1, dtype=np.int8)
+    length = np.full(n_games, n_cells, dtype=np.intp)
+    games = np.arange(n_games)
+
+    for ply in range(n_cells):
+        if len(games) == 0:
+            break
+        player = ply % 2
+        h = heights[games]
+        # uniform choice among non-full poles: argmax of masked noise
+        noise = rng.random(h.shape)
+        noise[h >= dim] = -1.0
+        pole = noise.argmax(axis=1)
+        cell = pole*dim + h[np.arange(len(games)), pole]
+        board[games, cell] = player + 1
+        heights[games, pole] += 1
+
+        stones = board[games[:, None, None], lines[through[cell]]]
+        won = (stones == player + 1).all(axis=2).any(axis=1)
+        winner[games[won]] = player
+        length[games[won]] = ply + 1
+        games = games[~won]
+
+    return winner, length
+
+
+def simulate(n_games, dim=3, batch_size=10000, seed=None):
+    rng = np.random.default_rng(seed)
+    win_num = [0, 0]
+    draw_num = 0
+    length_hist = np.zeros(dim**3 + 1, dtype=np.int64)
+
+    for start in range(0, n_games, batch_size):
+        winner, length = simulate_batch(
+            min(batch_size, n_games - start), dim, rng)
+        win_num[0] += int((winner == 0).sum())
+        win_num[1] += int((winner == 1).sum())
+        draw_num += int((winner == -1).sum())
+        length_hist += np.bincount(length, minlength=dim**3 + 1)
+
+    return {
+        "dim": dim,
+        "games": n_games,
+        "win_num": win_num,
+        "draw_num": draw_num,
+        "length_hist": length_hist.tolist(),
+        "mean_length":
+            float((length_hist * np.arange(len(length_hist))).sum())
+            / max(n_games, 1),
+    }
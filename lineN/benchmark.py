@@ -0,0 +1,232 @@
+import argparse
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "line4"))
+
+import line4
+from lineN import Game
+from bitboard import BitGame
+from incremental import IncrementalGame
+
+
+LINEN_ENGINES = {
+    "lineN.Game": Game,
+    "lineN.BitGame": BitGame,
+    "lineN.IncrementalGame": IncrementalGame,
+}
+
+
+def measure(func, min_time=0.2, repeat=3):
+    # best of `repeat` rounds; each round calls func until min_time has
+    # passed. func returns how many operations it performed.
+    best = 0.0
+    for _ in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            ops += func()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, ops/elapsed)
+    return best
+
+
+def fill_order(dim, rng):
+    # one legal pole per stone until the board is full
+    order = [(x, y) for x in range(dim) for y in range(dim)]*dim
+    rng.shuffle(order)
+    return order
+
+
+def open_poles(board, dim):
+    if hasattr(board, "heights"):
+        return [divmod(p, dim) for p, h in enumerate(board.heights)
+                if h < dim]
+    return [(x, y) for x in range(dim) for y in range(dim)
+            if board.board[x][y][-1] is None]
+
+
+def random_game(game, rng):
+    game.restart_game()
+    for _ in range(game.d**3):
+        game.put_stone(*rng.choice(open_poles(game.b, game.d)))
+        if game.finished:
+            break
+    return 1
+
+
+def half_played(game, rng):
+    # a position about half full with no winner yet
+    for x, y in fill_order(game.d, rng):
+        if len(game.moves) >= game.d**3 // 2:
+            break
+        game.put_stone(x, y)
+        if game.finished:
+            game.undo_move()
+    return game
+
+
+def bench_linen(name, game_class, dim, min_time):
+    rng = random.Random(dim)
+    results = {}
+    orders = [fill_order(dim, rng) for _ in range(16)]
+    colors = ["BB", "WW"]
+
+    def put_stone():
+        b = game_class.board_class(dim, False)
+        for n, position in enumerate(orders[rng.randrange(16)]):
+            b.put_stone(position, colors[n % 2])
+        return dim**3
+    results["put_stone"] = measure(put_stone, min_time)
+
+    game = half_played(game_class(dim, disp=False), rng)
+    if game_class is IncrementalGame:
+        position, color = game.moves[-1]
+        def winner():
+            game.j.remove(position, color)
+            game.j.put(position, color)
+            return 1
+    else:
+        def winner():
+            game.check_winner()
+            return 1
+    results["winner"] = measure(winner, min_time)
+
+    play = game_class(dim, disp=False)
+    results["random_game"] = measure(
+        lambda: random_game(play, rng), min_time)
+    results["repr"] = measure(lambda: repr(game) and 1, min_time)
+    return {"{}/dim={}/{}".format(name, dim, k): v
+            for k, v in results.items()}
+
+
+def bench_line4(min_time):
+    rng = random.Random(4)
+    results = {}
+    orders = [fill_order(4, rng) for _ in range(16)]
+    sink = io.StringIO()
+
+    def put_stone():
+        b = line4.Board()
+        for n, position in enumerate(orders[rng.randrange(16)]):
+            b.put_stone(position, n % 2)
+        return 64
+    results["put_stone"] = measure(put_stone, min_time)
+
+    b = line4.Board()
+    for n, position in enumerate(orders[0][:32]):
+        b.put_stone(position, n % 2)
+    j = line4.Judge()
+    def winner():
+        j.winner(b.board)
+        return 1
+    results["winner"] = measure(winner, min_time)
+
+    def game():
+        # line4.Game always prints; the text goes to a buffer
+        sink.seek(0)
+        sink.truncate()
+        with redirect_stdout(sink):
+            g = line4.Game()
+            for _ in range(64):
+                g.put_stone(*rng.choice(open_poles(g.b, 4)))
+                if g.finished:
+                    break
+        return 1
+    results["random_game"] = measure(game, min_time)
+
+    with redirect_stdout(sink):
+        g = line4.Game()
+    g.b = b
+    results["repr"] = measure(lambda: repr(g) and 1, min_time)
+    return {"line4.Game/dim=4/{}".format(k): v
+            for k, v in results.items()}
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # all results are operations per second, so lower is worse
+    regressions = []
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = value / base
+        mark = ""
+        if ratio < 1 - tolerance:
+            mark = "  REGRESSION"
+            regressions.append(key)
+        print("{:45s} {:12.1f} {:12.1f} {:6.2f}x{}".format(
+            key, base, value, ratio, mark))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the lineN and line4 engines.")
+    parser.add_argument("--dims", type=int, nargs="+",
+                        default=[3, 4, 5, 6, 7])
+    parser.add_argument("--engines", nargs="+",
+                        default=list(LINEN_ENGINES) + ["line4.Game"])
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--baseline", help="JSON results to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.engines:
+        if name == "line4.Game":
+            results.update(bench_line4(args.min_time))
+            continue
+        for dim in args.dims:
+            results.update(bench_linen(
+                name, LINEN_ENGINES[name], dim, args.min_time))
+    for key, value in sorted(results.items()):
+        print("{:45s} {:12.1f} ops/s {:10.2f} us/op".format(
+            key, value, 1e6/value))
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
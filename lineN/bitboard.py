@@ -0,0 +1,192 @@
+from functools import lru_cache
+from itertools import product
+
+from lineN import Game, OpenPoles, coordinates_text
+from lines import cell_line_table, flat_index, line_table
+
+
+# Cell (x, y, z) is stored at bit (x*dim + y)*dim + z, so every pole
+# occupies `dim` consecutive bits and its bottom cell is bit pole*dim.
+def cell_bit(dim, x, y, z):
+    return (x*dim + y)*dim + z
+
+
+@lru_cache(maxsize=None)
+def line_masks(dim, ndim=3, k=None):
+    return tuple(
+        sum(1 << i for i in line) for line in line_table(ndim, dim, k))
+
+
+@lru_cache(maxsize=None)
+def cell_line_masks(dim, ndim=3, k=None):
+    # cell_line_masks(...)[cell]: the masks of the lines through cell
+    masks = line_masks(dim, ndim, k)
+    return tuple(
+        tuple(masks[n] for n in ids)
+        for ids in cell_line_table(ndim, dim, k))
+
+
+@lru_cache(maxsize=None)
+def pole_table(dim, ndim=3):
+    # every pole position, and its index, in flat_index order
+    poles = tuple(product(range(dim), repeat=ndim-1))
+    return poles, {pole: i for i, pole in enumerate(poles)}
+
+
+class BitBoard(object):
+    # One mask per player in a two-slot list; colors[slot] says whose,
+    # filled in as the players' first stones come.
+    def __init__(self, dim, disp, ndim=3):
+        self.board = [0, 0]
+        self.colors = [None, None]
+        self.heights = [0]*(dim**(ndim-1))
+        self.poles, self.pole_index = pole_table(dim, ndim)
+        self.last_position = None
+        self.last_cell = None
+        self.last_slot = None
+        self.open = OpenPoles(dim, ndim)
+        self.d = dim
+        self.n = ndim
+        self.disp = disp
+
+    def put_stone(self, position, color):
+        try:
+            pole = self.pole_index[position]
+        except (KeyError, TypeError):
+            pole = self.check_position(position)
+            if pole is None:
+                return None
+        return self.put_stone_pole(pole, color)
+
+    def check_position(self, position):
+        # the pole of a position not given as a tuple, or None after
+        # saying what is wrong with it
+        try:
+            if len(position) != self.n-1:
+                raise ValueError
+            pole = self.pole_index[tuple(position)]
+        except (ValueError, TypeError):
+            if self.disp:
+                print("ERROR! " \
+                      "Position should be ({0}) or [{0}].".format(
+                          coordinates_text(self.n)))
+        except KeyError:
+            if self.disp:
+                print("ERROR! " \
+                      "Position ({}) should be " \
+                      "included in 0-{}.".format(
+                          coordinates_text(self.n), self.d-1))
+        else:
+            return pole
+        return None
+
+    def put_stone_pole(self, pole, color):
+        if color is None:
+            if self.disp:
+                print("ERROR! 'color' should not be None.")
+            return None
+        z = self.heights[pole]
+        if z == self.d:
+            if self.disp:
+                print("This pole is full!")
+            return False
+        self.heights[pole] = z + 1
+        self.last_position = self.poles[pole] + (z,)
+        if z + 1 == self.d:
+            self.open.close(self.poles[pole])
+        slot = 0 if color == self.colors[0] else self.slot(color)
+        self.last_cell = cell = pole*self.d + z
+        self.last_slot = slot
+        self.board[slot] |= 1 << cell
+        return True
+
+    def slot(self, color):
+        colors = self.colors
+        if color == colors[1]:
+            return 1
+        if colors[0] is None:
+            colors[0] = color
+            return 0
+        if colors[1] is None:
+            colors[1] = color
+            return 1
+        raise Exception("A BitBoard holds the stones of 2 players only.")
+
+    def remove_stone(self, position):
+        pole = self.pole_index[tuple(position[:-1])]
+        bit = 1 << (pole*self.d + position[-1])
+        self.heights[pole] = position[-1]
+        self.open.reopen(self.poles[pole])
+        for slot, mask in enumerate(self.board):
+            if mask & bit:
+                self.board[slot] = mask & ~bit
+                return self.colors[slot]
+
+    def cell(self, *position):
+        bit = 1 << flat_index(position, self.d)
+        for slot, mask in enumerate(self.board):
+            if mask & bit:
+                return self.colors[slot]
+        return None
+
+
+class BitJudge(object):
+    def __init__(self, dim, ndim=3, k=None):
+        self.d = dim
+        self.masks = line_masks(dim, ndim, k)
+        self.cell_masks = cell_line_masks(dim, ndim, k)
+
+    def has_line(self, mask):
+        for line in self.masks:
+            if mask & line == line:
+                return True
+        return False
+
+    def has_line_through(self, mask, cell):
+        for line in self.cell_masks[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+    def winner(self, board):
+        # board: a BitBoard; looks at every line of both players
+        w_list = [
+            color for color, mask in zip(board.colors, board.board)
+            if color is not None and self.has_line(mask)]
+        N = len(w_list)
+        if N == 0:
+            return None
+        elif N == 1:
+            return w_list[0]
+        else:
+            raise Exception(
+                "The board status is invalid; " \
+                "more than 2 players make line(s).")
+
+    def last_winner(self, board):
+        # only lines through the last stone can have just been made
+        slot = board.last_slot
+        if slot is not None and \
+                self.has_line_through(board.board[slot], board.last_cell):
+            return board.colors[slot]
+        return None
+
+
+class BitGame(Game):
+    board_class = BitBoard
+    judge_class = BitJudge
+
+    def check_winner(self):
+        return self.j.last_winner(self.b)
+
+    def winning_poles(self, color):
+        # the top cell of each open pole, against the lines through it
+        b = self.b
+        mask = b.board[b.colors.index(color)] if color in b.colors else 0
+        poles = []
+        for pole in b.open.poles:
+            i = b.pole_index[pole]
+            cell = i*self.d + b.heights[i]
+            if self.j.has_line_through(mask | 1 << cell, cell):
+                poles.append(pole)
+        return poles
@@ -0,0 +1,165 @@
+import mmap
+import os
+import struct
+
+from position import inverse_symmetries
+
+
+# File layout (all integers little-endian except the keys):
+#   header  : magic b"LNBK", version, dim, key_bytes, record count
+#   records : sorted by key; each is
+#             key (two big-endian masks of key_bytes each, so that byte
+#             order equals numeric order), value int16, pole uint8
+#             (255 for none), depth uint8
+HEADER = struct.Struct("<4sBBHQ")
+MAGIC = b"LNBK"
+VERSION = 1
+ENTRY = struct.Struct("<hBB")
+NO_POLE = 255
+
+
+def key_bytes(dim):
+    return (dim**3 + 7) // 8
+
+
+def pack_key(key, n_bytes):
+    return key[0].to_bytes(n_bytes, "big") + key[1].to_bytes(n_bytes, "big")
+
+
+class BookWriter(object):
+    def __init__(self, path, dim):
+        self.path = path
+        self.d = dim
+        self.n_bytes = key_bytes(dim)
+        self.entries = {}
+
+    def add(self, key, value, pole, depth):
+        # key is a canonical key as given by Position.canonical(), and
+        # pole is in the canonical frame; deeper results win
+        packed = pack_key(key, self.n_bytes)
+        old = self.entries.get(packed)
+        depth = min(depth, 255)
+        if old is None or old[2] <= depth:
+            self.entries[packed] = (
+                value, NO_POLE if pole is None else pole, depth)
+
+    def merge(self, book):
+        for packed, entry in book.items():
+            old = self.entries.get(packed)
+            if old is None or old[2] < entry[2]:
+                self.entries[packed] = entry
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, self.d, self.n_bytes, len(self.entries)))
+            for packed in sorted(self.entries):
+                f.write(packed)
+                f.write(ENTRY.pack(*self.entries[packed]))
+        os.replace(tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.write()
+
+
+class Book(object):
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dim, n_bytes, count = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception(
+                "{} is not a lineN book (version {}).".format(
+                    path, VERSION))
+        self.d = dim
+        self.n_bytes = n_bytes
+        self.count = count
+        self.key_size = 2*n_bytes
+        self.record_size = self.key_size + ENTRY.size
+        self.inv_syms = inverse_symmetries(dim)
+
+    def __len__(self):
+        return self.count
+
+    def record_key(self, n):
+        start = HEADER.size + n*self.record_size
+        return self.mm[start:start + self.key_size]
+
+    def record_entry(self, n):
+        start = HEADER.size + n*self.record_size + self.key_size
+        return ENTRY.unpack_from(self.mm, start)
+
+    def find(self, packed):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.record_key(mid) < packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.record_key(lo) == packed:
+            return lo
+        return None
+
+    def lookup(self, key):
+        # (value, pole, depth) for a canonical key, pole in the
+        # canonical frame; None when the position is not in the book
+        n = self.find(pack_key(key, self.n_bytes))
+        if n is None:
+            return None
+        value, pole, depth = self.record_entry(n)
+        return value, None if pole == NO_POLE else pole, depth
+
+    def probe(self, pos):
+        key, sym = pos.canonical()
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        value, pole, depth = entry
+        if pole is not None:
+            pole = self.inv_syms[sym][pole]
+        return value, pole, depth
+
+    def items(self):
+        for n in range(self.count):
+            yield self.record_key(n), self.record_entry(n)
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from position import Position
+    from solver import Solver
+
+    # python book.py <path> [dim] [seconds]: solve from the empty board
+    # and add the exact results to the book at <path>
+    path = sys.argv[1]
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    time_limit = float(sys.argv[3]) if len(sys.argv) > 3 else None
+    writer = BookWriter(path, dim)
+    book = None
+    if os.path.exists(path):
+        book = Book(path)
+        writer.merge(book)
+    solver = Solver(dim, book=book)
+    print(solver.solve(Position(dim), time_limit=time_limit))
+    solver.export_book(writer)
+    if book is not None:
+        book.close()
+    writer.write()
+    print("{} positions in {}".format(len(writer.entries), path))
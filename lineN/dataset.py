@@ -0,0 +1,255 @@
+import argparse
+import json
+from multiprocessing import Pool
+import os
+import sys
+import time
+
+import numpy as np
+
+from incremental import IncrementalGame
+from playout import heavy_policy, random_policy
+from position import gravity_symmetries
+from record import DRAW
+from runner import chunk_rng
+
+
+# Self-play positions as structured NumPy rows, one per move played:
+#   board   int8 (dim, dim, dim), 0 empty, 1 first player, 2 second
+#   turn    int8, the side to move (0 first, 1 second)
+#   move    int16, the pole played, x*dim + y
+#   outcome int8, 0 or 1 for the winner of the game, 2 for a draw
+# Games are played by a pool of workers, chunk by chunk; the parent
+# augments, deduplicates and appends the rows to shards of shard_size
+# rows (shard-00000.npy, ...), so only one shard is held in memory.
+# Every shard opens with np.load(path, mmap_mode="r").
+
+
+def row_dtype(dim):
+    return np.dtype([
+        ("board", np.int8, (dim, dim, dim)),
+        ("turn", np.int8),
+        ("move", np.int16),
+        ("outcome", np.int8),
+    ])
+
+
+def greedy_policy(g, rng, epsilon=0.1):
+    # one-ply lookahead on the incremental evaluation; a random move
+    # with probability epsilon keeps the games apart
+    if rng.random() < epsilon:
+        return random_policy(g, rng)
+    me = g.turn
+    best, best_score = [], None
+    for x in range(g.d):
+        for y in range(g.d):
+            if g.b.board[x][y][-1] is not None:
+                continue
+            g.play_stone(x, y)
+            score = g.evaluate(me)
+            g.undo_move()
+            if best_score is None or score > best_score:
+                best, best_score = [(x, y)], score
+            elif score == best_score:
+                best.append((x, y))
+    return rng.choice(best)
+
+
+POLICIES = {"random": random_policy, "heavy": heavy_policy,
+            "greedy": greedy_policy}
+
+
+def play_chunk(args):
+    # rows of n_games self-play games
+    dim, seed, chunk, n_games, policy = args
+    rng = chunk_rng(seed, chunk)
+    choose = POLICIES[policy]
+    g = IncrementalGame(dim=dim, disp=False, player1=0, player2=1)
+    rows = np.zeros(n_games*dim**3, dtype=row_dtype(dim))
+    n = 0
+    for _ in range(n_games):
+        g.restart_game()
+        board = np.zeros((dim, dim, dim), dtype=np.int8)
+        start = n
+        while not g.finished and len(g.moves) < dim**3:
+            x, y = choose(g, rng)
+            rows["board"][n] = board
+            rows["turn"][n] = g.turn
+            rows["move"][n] = x*dim + y
+            g.put_stone(x, y)
+            (_, _, z), color = g.moves[-1]
+            board[x, y, z] = color + 1
+            n += 1
+        rows["outcome"][start:n] = DRAW if g.winner is None else g.winner
+    return rows[:n]
+
+
+def augment(rows, dim):
+    # the rows under every gravity-keeping symmetry of the board
+    images = []
+    n = len(rows)
+    boards = rows["board"].reshape(n, dim*dim, dim)
+    for perm in gravity_symmetries(dim):
+        image = rows.copy()
+        moved = np.empty_like(boards)
+        moved[:, list(perm)] = boards
+        image["board"] = moved.reshape(n, dim, dim, dim)
+        image["move"] = np.array(perm, dtype=np.int16)[rows["move"]]
+        images.append(image)
+    return np.concatenate(images)
+
+
+class SeenFilter(object):
+    # Bloom filter over 64-bit row keys: a fixed n_bits of memory
+    # however many rows pass, at the price of dropping a few unseen rows
+    # as false positives (about 0.2% at 5e7 rows in 2**31 bits).
+    def __init__(self, dim, n_bits=1 << 31, seed=0):
+        self.n_bits = n_bits
+        self.bits = np.zeros(n_bits // 8, dtype=np.uint8)
+        rng = np.random.default_rng(seed)
+        # Zobrist keys per cell and value, plus one per pole for the move
+        self.cell_keys = rng.integers(
+            0, 1 << 64, size=(dim**3, 3), dtype=np.uint64)
+        self.move_keys = rng.integers(
+            0, 1 << 64, size=dim*dim, dtype=np.uint64)
+        self.cells = np.arange(dim**3)
+
+    def keys(self, rows):
+        # a position with a move; the side to move follows from the board
+        boards = rows["board"].reshape(len(rows), -1)
+        return np.bitwise_xor.reduce(
+            self.cell_keys[self.cells, boards], axis=1) ^ \
+            self.move_keys[rows["move"]]
+
+    def unseen(self, rows):
+        # mask of the rows not met before (nor earlier in rows); marks
+        # them as seen
+        keys = self.keys(rows)
+        _, first = np.unique(keys, return_index=True)
+        fresh = np.zeros(len(rows), dtype=bool)
+        fresh[first] = True
+        probes = [keys % np.uint64(self.n_bits),
+                  (keys >> np.uint64(32)) * np.uint64(0x9E3779B1)
+                  % np.uint64(self.n_bits)]
+        seen = np.ones(len(rows), dtype=bool)
+        for p in probes:
+            seen &= (self.bits[p >> np.uint64(3)] >>
+                     (p & np.uint64(7)).astype(np.uint8)) & 1 == 1
+        fresh &= ~seen
+        for p in probes:
+            p = p[fresh]
+            bit = np.uint8(1) << (p & np.uint64(7)).astype(np.uint8)
+            np.bitwise_or.at(self.bits, p >> np.uint64(3), bit)
+        return fresh
+
+
+class ShardWriter(object):
+    def __init__(self, directory, dim, shard_size=1 << 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.d = dim
+        self.shard_size = shard_size
+        self.buffer = np.zeros(shard_size, dtype=row_dtype(dim))
+        self.n = 0
+        self.shards = []
+
+    def add(self, rows):
+        while len(rows):
+            take = min(len(rows), self.shard_size - self.n)
+            self.buffer[self.n:self.n + take] = rows[:take]
+            self.n += take
+            rows = rows[take:]
+            if self.n == self.shard_size:
+                self.flush()
+
+    def flush(self):
+        if self.n == 0:
+            return
+        name = "shard-{:05d}.npy".format(len(self.shards))
+        path = os.path.join(self.directory, name)
+        np.save(path + ".tmp.npy", self.buffer[:self.n])
+        os.replace(path + ".tmp.npy", path)
+        self.shards.append({"file": name, "rows": self.n})
+        self.n = 0
+
+    def close(self, **info):
+        self.flush()
+        index = dict(info, dim=self.d, shards=self.shards,
+                     rows=sum(s["rows"] for s in self.shards))
+        with open(os.path.join(self.directory, "index.json"), "w") as f:
+            json.dump(index, f, indent=1)
+        return index
+
+
+def load_shards(directory):
+    # memory-mapped shards of a dataset, in order
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+    return [np.load(os.path.join(directory, s["file"]), mmap_mode="r")
+            for s in index["shards"]]
+
+
+def generate(directory, n_games, dim=3, seed=0, workers=None,
+             chunk_size=100, shard_size=1 << 20, policy="random",
+             augment_rows=False, dedup=False, filter_bits=1 << 31,
+             progress=True):
+    tasks = [
+        (dim, seed, chunk, min(chunk_size, n_games - start), policy)
+        for chunk, start in enumerate(range(0, n_games, chunk_size))]
+    writer = ShardWriter(directory, dim, shard_size)
+    seen = SeenFilter(dim, filter_bits, seed) if dedup else None
+    played = kept = done = 0
+    start_time = last_report = time.time()
+    if workers is None:
+        workers = os.cpu_count()
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        # in chunk order, so that a seed always gives the same shards
+        results = map(play_chunk, tasks) if pool is None \
+            else pool.imap(play_chunk, tasks)
+        for task, rows in zip(tasks, results):
+            played += len(rows)
+            if augment_rows:
+                rows = augment(rows, dim)
+            if seen is not None:
+                rows = rows[seen.unseen(rows)]
+            writer.add(rows)
+            kept += len(rows)
+            done += task[3]
+            if progress and time.time() - last_report >= 1.0:
+                last_report = time.time()
+                print("{}/{} games, {} rows".format(done, n_games, kept),
+                      file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return writer.close(
+        games=n_games, seed=seed, policy=policy, positions=played,
+        augmented=augment_rows, deduplicated=dedup,
+        seconds=time.time() - start_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write lineN self-play positions as .npy shards.")
+    parser.add_argument("directory")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--shard-size", type=int, default=1 << 20)
+    parser.add_argument("--policy", choices=sorted(POLICIES),
+                        default="random")
+    parser.add_argument("--augment", action="store_true",
+                        help="add the 8 symmetric images of every row")
+    parser.add_argument("--dedup", action="store_true",
+                        help="drop rows whose position and move were seen")
+    args = parser.parse_args()
+    index = generate(
+        args.directory, args.games, args.dim, args.seed, args.workers,
+        args.chunk_size, args.shard_size, args.policy, args.augment,
+        args.dedup)
+    print("{rows} rows in {n} shards ({positions} positions played, "
+          "{seconds:.1f}s)".format(n=len(index["shards"]), **index))
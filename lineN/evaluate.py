@@ -0,0 +1,46 @@
+# Heuristic scores from the open-line counts an IncrementalJudge keeps
+# (see incremental.py), so scoring a position costs O(k) plus a look at
+# the threat lines, whatever the size of the board. A line still open
+# for a player is worth more the more of its stones it holds; threats
+# (open lines one stone short) that can be played at once decide the
+# game within a move or two.
+WIN = 1 << 20
+
+
+def line_weights(k):
+    # weights[n] for an open line with n stones, n < k
+    return [4**n for n in range(k)]
+
+
+def features(judge, color):
+    playable = judge.threat_cells(color, playable=True)
+    return {
+        "winnable": judge.winnable(color),
+        "open": [judge.open_lines(color, n) for n in range(judge.k + 1)],
+        "open_threes": judge.open_lines(color, judge.k - 1),
+        "threat_cells": len(judge.threat_cells(color)),
+        "playable_threats": len(playable),
+        "double_threat": len(playable) >= 2,
+    }
+
+
+def evaluate(game, color, weights=None):
+    # Score for color, positive when it is ahead: +-WIN once someone has
+    # won, +-(WIN - 1) when the side to move can win at once, +-(WIN - 2)
+    # when the other side has a double threat the mover cannot stop.
+    judge = game.j
+    other = game.dict_players[color]
+    if judge.last_winner is not None:
+        return WIN if judge.last_winner == color else -WIN
+    mover = game.turn
+    waiting = game.dict_players[mover]
+    sign = 1 if mover == color else -1
+    if judge.threat_cells(mover, playable=True):
+        return sign*(WIN - 1)
+    if len(judge.threat_cells(waiting, playable=True)) >= 2:
+        return -sign*(WIN - 2)
+    if weights is None:
+        weights = line_weights(judge.k)
+    return sum(
+        w*(judge.open_lines(color, n) - judge.open_lines(other, n))
+        for n, w in enumerate(weights))
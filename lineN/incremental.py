@@ -0,0 +1,136 @@
+from evaluate import evaluate
+from lineN import Game
+from lines import cell_line_table, flat_index, line_table, position_of
+
+
+class IncrementalJudge(object):
+    # Keeps, per color, the number of its stones in every line, and
+    # open[color][n]: how many lines hold n stones of that color and none
+    # of any other (lines the color can still complete). A line is open
+    # for a color exactly while its count equals the line's total.
+    def __init__(self, dim, ndim=3, k=None):
+        self.d = dim
+        # 4 to 13 lines pass through each cell of a 3-D board
+        self.cell_lines = cell_line_table(ndim, dim, k)
+        self.lines = line_table(ndim, dim, k)
+        self.n_lines = len(self.lines)
+        self.k = dim if k is None else k
+        self.counts = {}
+        self.open = {}
+        self.totals = [0]*self.n_lines
+        self.filled = set()
+        self.threat_lines = {}
+        self.last_winner = None
+
+    def add_color(self, color):
+        self.counts[color] = [0]*self.n_lines
+        self.open[color] = [0]*(self.k + 1)
+        self.open[color][0] = self.totals.count(0)
+        self.threat_lines[color] = set()
+
+    def put(self, position, color):
+        if color not in self.counts:
+            self.add_color(color)
+        counts = self.counts[color]
+        hist = self.open[color]
+        totals = self.totals
+        k = self.k
+        cell = flat_index(position, self.d)
+        for n in self.cell_lines[cell]:
+            total = totals[n]
+            if counts[n] == total:
+                hist[total] -= 1
+                hist[total + 1] += 1
+                if total == k - 2:
+                    self.threat_lines[color].add(n)
+                elif total == k - 1:
+                    self.threat_lines[color].discard(n)
+            if counts[n] == 0:
+                # the line may be open for other colors; not any more
+                for other, other_counts in self.counts.items():
+                    if other_counts[n] == total and other != color:
+                        self.open[other][total] -= 1
+                        if total == k - 1:
+                            self.threat_lines[other].discard(n)
+            counts[n] += 1
+            totals[n] = total + 1
+            if total + 1 == k and counts[n] == k:
+                if self.last_winner not in (None, color):
+                    raise Exception(
+                        "The board status is invalid; " \
+                        "more than 2 players make line(s).")
+                self.last_winner = color
+        self.filled.add(cell)
+        return self.last_winner
+
+    def remove(self, position, color):
+        counts = self.counts[color]
+        hist = self.open[color]
+        totals = self.totals
+        k = self.k
+        cell = flat_index(position, self.d)
+        for n in self.cell_lines[cell]:
+            counts[n] -= 1
+            total = totals[n] = totals[n] - 1
+            if counts[n] == total:
+                hist[total + 1] -= 1
+                hist[total] += 1
+                if total == k - 1:
+                    self.threat_lines[color].add(n)
+                elif total == k - 2:
+                    self.threat_lines[color].discard(n)
+            if counts[n] == 0:
+                for other, other_counts in self.counts.items():
+                    if other_counts[n] == total and other != color:
+                        self.open[other][total] += 1
+                        if total == k - 1:
+                            self.threat_lines[other].add(n)
+        self.filled.discard(cell)
+        if self.last_winner == color and k not in counts:
+            self.last_winner = None
+
+    def winnable(self, color):
+        # lines still open for color
+        if color not in self.open:
+            return self.totals.count(0)
+        return sum(self.open[color])
+
+    def open_lines(self, color, n):
+        if color not in self.open:
+            return self.totals.count(0) if n == 0 else 0
+        return self.open[color][n]
+
+    def threat_cells(self, color, playable=False):
+        # empty cells completing a line of color; with playable, only
+        # those a stone can be dropped on right now
+        cells = set()
+        for n in self.threat_lines.get(color, ()):
+            for i in self.lines[n]:
+                if i not in self.filled:
+                    cells.add(i)
+        if playable:
+            cells = set(i for i in cells
+                        if i % self.d == 0 or i - 1 in self.filled)
+        return cells
+
+    def winner(self, board):
+        return self.last_winner
+
+
+class IncrementalGame(Game):
+    judge_class = IncrementalJudge
+
+    def check_winner(self):
+        return self.j.put(self.b.last_position, self.turn)
+
+    def uncheck_winner(self, position, color):
+        self.j.remove(position, color)
+
+    def winning_poles(self, color):
+        # read off the judge's threat lines instead of trying every pole
+        return [position_of(cell // self.d, self.d, self.n - 1)
+                for cell in self.j.threat_cells(color, playable=True)]
+
+    def evaluate(self, color=None):
+        # heuristic score for color (the side to move by default)
+        return evaluate(self, self.turn if color is None else color)
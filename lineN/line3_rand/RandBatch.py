@@ -0,0 +1,19 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(".."))
+
+from batch import simulate
+
+
+
+if __name__ == '__main__':
+    start = time.time()
+    result = simulate(1000000, dim=3, batch_size=100000)
+    win_num = result["win_num"]
+
+    print(win_num, "draw={}".format(result["draw_num"]))
+    print("{}%".format(100*win_num[0]/sum(win_num)))
+    print("mean length={:.2f}".format(result["mean_length"]))
+    print("{:.1f}s".format(time.time() - start))
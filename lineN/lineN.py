@@ -1,34 +1,110 @@
+from functools import lru_cache
 from itertools import product
-import numpy as np
+from random import Random
+
+# as part of the lineN package, or as a flat module with lineN/ on the
+# path (the scripts here)
+try:
+    from .lines import flat_index, line_table
+    from .render import TextRenderer
+except ImportError:
+    from lines import flat_index, line_table
+    from render import TextRenderer
+
+
+@lru_cache(maxsize=None)
+def zobrist_table(dim, ndim=3):
+    # zobrist_table(dim)[player][flat_index(position, dim)] and a
+    # side-to-move key; seeded by the shape so hashes are stable across
+    # runs and processes
+    rng = Random("{}:{}".format(dim, ndim))
+    table = [
+        [rng.getrandbits(64) for _ in range(dim**ndim)]
+        for _ in range(2)]
+    return table, rng.getrandbits(64)
+
+
+def coordinates_text(ndim):
+    if ndim <= 4:
+        return ", ".join("xyz"[:ndim-1])
+    return "x1, ..., x{}".format(ndim-1)
+
+
+class OpenPoles(object):
+    # The poles that still take a stone, in a list plus each one's index
+    # in it: a uniform legal pole is a single pick, and a pole filling up
+    # (swapped with the last entry and popped) or opening again
+    # (appended) costs O(1).
+    def __init__(self, dim, ndim=3):
+        self.poles = list(product(range(dim), repeat=ndim-1))
+        self.index = {pole: i for i, pole in enumerate(self.poles)}
+
+    def close(self, pole):
+        i = self.index.pop(pole)
+        last = self.poles.pop()
+        if i < len(self.poles):
+            self.poles[i] = last
+            self.index[last] = i
+
+    def reopen(self, pole):
+        if pole not in self.index:
+            self.index[pole] = len(self.poles)
+            self.poles.append(pole)
+
+    def choice(self, rng):
+        return self.poles[int(rng.random()*len(self.poles))]
+
+    def __len__(self):
+        return len(self.poles)
+
+    def __contains__(self, pole):
+        return pole in self.index
 
 
 class Board(object):
-    def __init__(self, dim, disp):
-        self.board = [
-            [[None]*dim for _ in range(dim)]
-            for _ in range(dim)
-        ]
+    def __init__(self, dim, disp, ndim=3):
+        self.board = self.empty_board(dim, ndim)
         self.d = dim
+        self.n = ndim
         self.disp = disp
+        self.last_position = None
+        self.open = OpenPoles(dim, ndim)
+
+    def empty_board(self, dim, ndim):
+        if ndim == 1:
+            return [None]*dim
+        return [self.empty_board(dim, ndim-1) for _ in range(dim)]
         
     def put_stone(self, position, color):
         try:
-            x, y = position
-            pole = self.board[x][y]
+            if len(position) != self.n-1:
+                raise ValueError
+            pole = self.board
+            for c in position:
+                pole = pole[c]
         except ValueError:
             if self.disp:
                 print("ERROR! " \
-                      "Position should be (x, y) or [x, y].")
+                      "Position should be ({0}) or [{0}].".format(
+                          coordinates_text(self.n)))
         except IndexError:
             if self.disp:
                 print("ERROR! " \
-                      "Position (x, y) should be " \
-                      "included in 0-{}.".format(self.d-1))
+                      "Position ({}) should be " \
+                      "included in 0-{}.".format(
+                          coordinates_text(self.n), self.d-1))
         except:
             if self.disp:
                 print("ERROR! Something went wrong.")
         else:
-            return self.put_stone_pole(self.board[x][y], color)
+            put = self.put_stone_pole(pole, color)
+            if put:
+                self.last_position = tuple(
+                    c % self.d for c in position) + (
+                        self.d-1-pole.count(None),)
+                if pole[-1] is not None:
+                    self.open.close(self.last_position[:-1])
+            return put
 
     def put_stone_pole(self, pole, color):
         if color is None:
@@ -43,51 +119,37 @@ class Board(object):
                 print("This pole is full!")
             return False
 
+    def cell(self, *position):
+        cells = self.board
+        for c in position:
+            cells = cells[c]
+        return cells
+
+    def remove_stone(self, position):
+        pole = self.board
+        for c in position[:-1]:
+            pole = pole[c]
+        color = pole[position[-1]]
+        pole[position[-1]] = None
+        self.open.reopen(tuple(position[:-1]))
+        return color
+
 
 class Judge(object):
-    def __init__(self, dim):
+    def __init__(self, dim, ndim=3, k=None):
         self.d = dim
-    
+        self.n = ndim
+        self.lines = line_table(ndim, dim, k)
+
+    def flatten(self, board):
+        cells = board
+        for _ in range(self.n - 1):
+            cells = [c for sub in cells for c in sub]
+        return cells
+
     def extract_lines(self, board):
-        lines_list = []
-        
-        # length 1 line
-        lines_list.extend([
-            [board[x][y][z] for x in range(self.d)]
-            for y, z in product(range(self.d), repeat=2)])
-        lines_list.extend([
-            [board[x][y][z] for y in range(self.d)]
-            for x, z in product(range(self.d), repeat=2)])
-        lines_list.extend([
-            [board[x][y][z] for z in range(self.d)]
-            for x, y in product(range(self.d), repeat=2)])
-        # length sqrt(2) line
-        lines_list.extend([
-            [board[x][x][y] for x in range(self.d)]
-            for y in range(self.d)])
-        lines_list.extend([
-            [board[x][self.d-1-x][y] for x in range(self.d)]
-            for y in range(self.d)])
-        lines_list.extend([
-            [board[x][y][x] for x in range(self.d)]
-            for y in range(self.d)])
-        lines_list.extend([
-            [board[x][y][self.d-1-x] for x in range(self.d)]
-            for y in range(self.d)])
-        lines_list.extend([
-            [board[y][x][x] for x in range(self.d)]
-            for y in range(self.d)])
-        lines_list.extend([
-            [board[y][x][self.d-1-x] for x in range(self.d)]
-            for y in range(self.d)])
-        # length sqrt(3) line
-        lines_list.extend([
-            [board[x][x][x] for x in range(self.d)],
-            [board[x][x][self.d-1-x] for x in range(self.d)],
-            [board[x][self.d-1-x][x] for x in range(self.d)],
-            [board[self.d-1-x][x][x] for x in range(self.d)]])
-
-        return lines_list
+        cells = self.flatten(board)
+        return [[cells[i] for i in line] for line in self.lines]
 
     def ocupy_component(self, x_list):
         N = len(x_list)
@@ -112,10 +174,20 @@ class Judge(object):
 
         
 class Game(object):
-    def __init__(self, dim=4, player1="BB", player2="WW", disp=True):
+    board_class = Board
+    judge_class = Judge
+    renderer_class = TextRenderer
+
+    def __init__(self, dim=4, player1="BB", player2="WW", disp=True,
+                 ndim=3, k=None, renderer_class=None):
         self.d = dim
-        self.b = Board(dim, disp)
-        self.j = Judge(dim)
+        self.n = ndim
+        self.k = k
+        self.b = self.board_class(dim, disp, ndim)
+        self.j = self.judge_class(dim, ndim, k)
+        if renderer_class is not None:
+            self.renderer_class = renderer_class
+        self.renderer = self.renderer_class(dim, ndim, [player1, player2])
         self.finished = False
         self.turn = player1
         self.dict_players = {
@@ -125,6 +197,10 @@ class Game(object):
         self.winner = None
         self.disp = disp
         self.players = [player1, player2]
+        self.moves = []
+        self.undone = []
+        self.zobrist, self.zobrist_side = zobrist_table(dim, ndim)
+        self.hash = 0
         
         if self.disp:
             print(self)
@@ -132,7 +208,7 @@ class Game(object):
 
     def restart_game(self):
         self.__init__(self.d, self.players[0], self.players[1],
-                      self.disp)
+                      self.disp, self.n, self.k, self.renderer_class)
             
     def change_turn(self):
         self.turn = self.dict_players[self.turn]
@@ -147,16 +223,24 @@ class Game(object):
     def show_board(self):
         print(self)
 
-    def put_stone(self, x, y):
-        if self.finished and self.disp:
-            print("The game has already finished. " \
-                  "The winner is {}.".format(self.winner))
+    def put_stone(self, *position):
+        put = self.play_stone(*position)
+        if put:
+            self.undone = []
+        return put
+
+    def play_stone(self, *position):
+        if self.finished:
+            if self.disp:
+                print("The game has already finished. " \
+                      "The winner is {}.".format(self.winner))
         else:
-            put = self.b.put_stone((x, y), self.turn)
+            put = self.b.put_stone(position, self.turn)
             if put:
+                self.record_move(self.b.last_position, self.turn)
                 if self.disp:
                     self.show_board()
-                self.winner = self.j.winner(self.b.board)
+                self.winner = self.check_winner()
                 if self.winner is not None:
                     if self.disp:
                         print("{} win!".format(self.winner))
@@ -165,24 +249,81 @@ class Game(object):
                     self.change_turn()
                     if self.disp:
                         self.show_turn()
+            return put
+
+    def record_move(self, position, color):
+        self.moves.append((position, color))
+        self.renderer.touch(position[:-1])
+        self.hash ^= self.zobrist[self.players.index(color)][
+            flat_index(position, self.d)] ^ self.zobrist_side
+
+    def undo_move(self):
+        if not self.moves:
+            if self.disp:
+                print("There is no move to undo.")
+            return False
+        position, color = self.moves.pop()
+        self.b.remove_stone(position)
+        self.renderer.touch(position[:-1])
+        self.hash ^= self.zobrist[self.players.index(color)][
+            flat_index(position, self.d)] ^ self.zobrist_side
+        self.uncheck_winner(position, color)
+        self.winner = None
+        self.finished = False
+        self.turn = color
+        self.undone.append(position[:-1])
+        if self.disp:
+            self.show_board()
+            self.show_turn()
+        return True
+
+    def redo_move(self):
+        if not self.undone:
+            if self.disp:
+                print("There is no move to redo.")
+            return False
+        return self.play_stone(*self.undone.pop())
+
+    def check_winner(self):
+        return self.j.winner(self.b.board)
+
+    def legal_poles(self):
+        return list(self.b.open.poles)
+
+    def random_pole(self, rng):
+        return self.b.open.choice(rng)
+
+    def winning_poles(self, color):
+        # poles where a stone of color would complete a line; tried on
+        # the board and taken back, the judge being asked directly
+        poles = []
+        last = self.b.last_position
+        for pole in self.legal_poles():
+            self.b.put_stone(pole, color)
+            position = self.b.last_position
+            if self.j.winner(self.b.board) == color:
+                poles.append(pole)
+            self.b.remove_stone(position)
+        self.b.last_position = last
+        return poles
+
+    def uncheck_winner(self, position, color):
+        pass
 
     def help(self):
         explanation = \
         "g = Game()        : start game \n"            \
         "g.put_stone(x, y) : put stone at (x, y) \n"   \
         "g.restart_game()  : restart game \n"          \
+        "g.undo_move()     : take back the last move \n" \
+        "g.redo_move()     : replay a taken back move \n" \
         "g.show_board()    : show board \n"            \
         "g.show_turn()     : show who's turn it is \n" \
         "g.show()          : show this"
         print(explanation)
 
     def __repr__(self):
-        v_board = [[[
-            self.b.board[x][y][z]
-            for x in range(self.d)]
-            for y in range(self.d-1, -1, -1)]
-            for z in range(self.d-1, -1, -1)]
-        return str(np.array(v_board))
+        return self.renderer.render(self.b.cell)
 
 if __name__ == "__main__":
     print("""
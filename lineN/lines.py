@@ -0,0 +1,55 @@
+from functools import lru_cache
+from itertools import product
+
+
+def flat_index(position, size):
+    # cells are numbered with the last (gravity) axis running fastest,
+    # so (x, y, z) on a 3-D board is (x*size + y)*size + z
+    n = 0
+    for c in position:
+        n = n*size + c
+    return n
+
+
+def position_of(n, size, ndim):
+    # inverse of flat_index for an ndim-long position
+    position = []
+    for _ in range(ndim):
+        n, c = divmod(n, size)
+        position.append(c)
+    return tuple(reversed(position))
+
+
+@lru_cache(maxsize=None)
+def directions(ndim):
+    # one of each pair of opposite directions: first non-zero entry is +1
+    return tuple(
+        v for v in product((-1, 0, 1), repeat=ndim)
+        if any(v) and v[next(i for i, c in enumerate(v) if c)] == 1)
+
+
+@lru_cache(maxsize=None)
+def line_table(ndim, size, k=None):
+    # Every run of k cells along a direction vector, as flat indices.
+    # Cached per shape, so all judges and games of a shape share it.
+    if k is None:
+        k = size
+    lines = []
+    for start in product(range(size), repeat=ndim):
+        for v in directions(ndim):
+            end = [s + (k-1)*c for s, c in zip(start, v)]
+            if all(0 <= e < size for e in end):
+                lines.append(tuple(
+                    flat_index([s + n*c for s, c in zip(start, v)], size)
+                    for n in range(k)))
+    return tuple(lines)
+
+
+@lru_cache(maxsize=None)
+def cell_line_table(ndim, size, k=None):
+    # cell_line_table(...)[cell] lists the ids of every line through cell
+    lines_of_cell = [[] for _ in range(size**ndim)]
+    for n, line in enumerate(line_table(ndim, size, k)):
+        for i in line:
+            lines_of_cell[i].append(n)
+    return tuple(map(tuple, lines_of_cell))
@@ -0,0 +1,187 @@
+from math import log, sqrt
+import random
+import time
+
+from position import Position
+
+
+def rollout(masks, heights, ply, dim, seed):
+    # random playout; returns the index of the winner or None for a draw
+    pos = Position(dim)
+    pos.masks = list(masks)
+    pos.heights = list(heights)
+    pos.ply = ply
+    rng = random.Random(seed)
+    while not pos.is_full():
+        if pos.play(rng.choice(pos.legal_poles())):
+            return 1 - pos.turn
+    return None
+
+
+def run_leaves(dim, leaves):
+    # the rollouts of several leaves in one task; leaves are
+    # (masks, heights, ply, seeds) and each gets a list of winners
+    return [[rollout(masks, heights, ply, dim, seed) for seed in seeds]
+            for masks, heights, ply, seeds in leaves]
+
+
+class Node(object):
+    __slots__ = ("pole", "mover", "parent", "children", "untried",
+                 "visits", "wins", "winner", "terminal")
+
+    def __init__(self, pole, mover, parent, untried):
+        self.pole = pole
+        self.mover = mover
+        self.parent = parent
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.0
+        self.winner = None
+        self.terminal = False
+
+    def select(self, c):
+        scale = c*sqrt(log(self.visits))
+        return max(
+            self.children.values(),
+            key=lambda n: n.wins/n.visits + scale/sqrt(n.visits))
+
+
+class MCTSPlayer(object):
+    def __init__(self, dim, iterations=None, time_limit=None, c=1.4,
+                 rollouts=1, executor=None, seed=None, batch=None, jobs=4):
+        # With an executor, each round trip to it carries `batch` leaves
+        # (32 by default) in `jobs` tasks; a leaf waiting for its rollouts
+        # counts as lost (virtual loss), so the leaves of a batch spread
+        # over the tree instead of piling onto the same path.
+        if iterations is None and time_limit is None:
+            iterations = 1000
+        if batch is None:
+            batch = 1 if executor is None else 32
+        self.d = dim
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.c = c
+        self.rollouts = rollouts
+        self.executor = executor
+        self.batch = batch
+        self.jobs = jobs
+        self.rng = random.Random(seed)
+        self.root = None
+        self.root_pos = None
+
+    def reuse_root(self, pos):
+        # Walk down from the previous root along the stones played since,
+        # so that statistics gathered for this position are kept.
+        node, old = self.root, self.root_pos
+        if node is None or old.ply > pos.ply or pos.ply - old.ply > 2:
+            return None
+        new_stones = []
+        for pole in range(self.d*self.d):
+            for z in range(old.heights[pole], pos.heights[pole]):
+                bit = 1 << (pole*self.d + z)
+                player = 0 if pos.masks[0] & bit else 1
+                new_stones.append((player, pole))
+        if any(old.masks[n] & ~pos.masks[n] for n in range(2)):
+            return None
+        # moves alternate starting with the player to move at `old`
+        new_stones.sort(key=lambda s: (s[0] - old.turn) % 2)
+        for player, pole in new_stones:
+            node = node.children.get(pole)
+            if node is None or node.mover != player:
+                return None
+        node.parent = None
+        return node
+
+    def run_rollouts(self, leaves):
+        tasks = [
+            args + ([self.rng.getrandbits(64) for _ in range(self.rollouts)],)
+            for args in leaves]
+        if self.executor is None:
+            return run_leaves(self.d, tasks)
+        size = -(-len(tasks) // self.jobs)
+        futures = [
+            self.executor.submit(run_leaves, self.d, tasks[i:i + size])
+            for i in range(0, len(tasks), size)]
+        return [results for f in futures for results in f.result()]
+
+    def descend(self, root, pos):
+        # selection and expansion; returns the leaf and, unless it ends
+        # the game, the position to roll out from. The leaf's rollouts
+        # are counted as visits along the path right away.
+        node = root
+        depth = 0
+        while not node.terminal and not node.untried and node.children:
+            node = node.select(self.c)
+            pos.play(node.pole)
+            depth += 1
+
+        if not node.terminal and node.untried:
+            pole = node.untried.pop(self.rng.randrange(len(node.untried)))
+            mover = pos.turn
+            won = pos.play(pole)
+            depth += 1
+            child = Node(pole, mover, node, pos.legal_poles())
+            if won:
+                child.terminal, child.winner = True, mover
+            elif pos.is_full():
+                child.terminal = True
+            node.children[pole] = child
+            node = child
+
+        args = None if node.terminal \
+            else (tuple(pos.masks), tuple(pos.heights), pos.ply)
+        for _ in range(depth):
+            pos.undo()
+        leaf = node
+        while node is not None:
+            node.visits += self.rollouts
+            node = node.parent
+        return leaf, args
+
+    def backup(self, node, results):
+        while node is not None:
+            for winner in results:
+                if winner is None:
+                    node.wins += 0.5
+                elif winner == node.mover:
+                    node.wins += 1.0
+            node = node.parent
+
+    def iterate(self, root, pos, batch=1):
+        leaves = [self.descend(root, pos) for _ in range(batch)]
+        pending = [(leaf, args) for leaf, args in leaves if args is not None]
+        for leaf, args in leaves:
+            if args is None:
+                self.backup(leaf, [leaf.winner]*self.rollouts)
+        results = self.run_rollouts([args for _, args in pending]) \
+            if pending else []
+        for (leaf, _), winners in zip(pending, results):
+            self.backup(leaf, winners)
+
+    def search(self, pos):
+        root = self.reuse_root(pos)
+        if root is None:
+            root = Node(None, 1 - pos.turn, None, pos.legal_poles())
+        deadline = None if self.time_limit is None \
+            else time.time() + self.time_limit
+        n = 0
+        while (self.iterations is None or n < self.iterations) and \
+                (deadline is None or time.time() < deadline):
+            batch = self.batch if self.iterations is None \
+                else min(self.batch, self.iterations - n)
+            self.iterate(root, pos, batch)
+            n += batch
+
+        best = max(root.children.values(), key=lambda c: c.visits)
+        self.root = best
+        self.root_pos = pos.copy()
+        self.root_pos.play(best.pole)
+        return best.pole
+
+    def choose(self, game):
+        pole = self.search(Position.from_game(game))
+        return divmod(pole, self.d)
+
+    def play(self, game):
+        game.put_stone(*self.choose(game))
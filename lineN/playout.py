@@ -0,0 +1,31 @@
+import random
+
+
+# Playout policies: policy(game, rng) -> pole for the side to move,
+# always a legal one, drawn from the board's list of open poles.
+
+
+def random_policy(game, rng):
+    return game.random_pole(rng)
+
+
+def heavy_policy(game, rng):
+    # wins at once when it can, else blocks the opponent's immediate
+    # win, else plays at random
+    poles = game.winning_poles(game.turn)
+    if not poles:
+        poles = game.winning_poles(game.dict_players[game.turn])
+    if poles:
+        return poles[int(rng.random()*len(poles))]
+    return game.random_pole(rng)
+
+
+POLICIES = {"random": random_policy, "heavy": heavy_policy}
+
+
+def playout(game, policy=random_policy, rng=random):
+    # plays the game out from its current position; returns the winner
+    # (None for a draw)
+    while not game.finished and len(game.b.open):
+        game.put_stone(*policy(game, rng))
+    return game.winner
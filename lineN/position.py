@@ -0,0 +1,146 @@
+from functools import lru_cache
+from itertools import permutations, product
+
+from bitboard import cell_bit, cell_line_masks, line_masks
+
+
+@lru_cache(maxsize=None)
+def gravity_symmetries(dim):
+    # The cube has 48 symmetries (axis permutations times reflections).
+    # Only those leaving the z axis alone keep "down" pointing down,
+    # and each of them is a permutation of the poles.
+    syms = []
+    for perm, signs in product(permutations(range(3)),
+                               product((False, True), repeat=3)):
+        if perm[2] != 2 or signs[2]:
+            continue
+        pole_perm = []
+        for x, y in product(range(dim), repeat=2):
+            c = (x, y)
+            nx, ny = (
+                dim-1-c[perm[i]] if signs[i] else c[perm[i]]
+                for i in range(2))
+            pole_perm.append(nx*dim + ny)
+        syms.append(tuple(pole_perm))
+    return tuple(syms)
+
+
+@lru_cache(maxsize=None)
+def inverse_symmetries(dim):
+    inverses = []
+    for perm in gravity_symmetries(dim):
+        inv = [0]*len(perm)
+        for p, q in enumerate(perm):
+            inv[q] = p
+        inverses.append(tuple(inv))
+    return tuple(inverses)
+
+
+@lru_cache(maxsize=None)
+def pole_order(dim):
+    # poles through many lines first; a good default move ordering
+    masks = line_masks(dim)
+    def n_lines(pole):
+        pole_mask = ((1 << dim) - 1) << (pole*dim)
+        return sum(1 for m in masks if m & pole_mask)
+    return tuple(sorted(range(dim*dim), key=lambda p: -n_lines(p)))
+
+
+def transform(mask, perm, dim):
+    column = (1 << dim) - 1
+    new = 0
+    for p, q in enumerate(perm):
+        new |= ((mask >> (p*dim)) & column) << (q*dim)
+    return new
+
+
+class Position(object):
+    def __init__(self, dim):
+        self.d = dim
+        self.masks = [0, 0]
+        self.heights = [0]*(dim*dim)
+        self.ply = 0
+        self.moves = []
+        self.n_cells = dim**3
+        self.cell_masks = cell_line_masks(dim)
+
+    @classmethod
+    def from_game(cls, game):
+        # any engine's game, through its board's cell()
+        if game.n != 3 or game.k not in (None, game.d):
+            raise Exception(
+                "Positions are 3-D boards with lines of dim stones, "
+                "but the game has ndim={}, k={}.".format(game.n, game.k))
+        pos = cls(game.d)
+        for x, y in product(range(game.d), repeat=2):
+            for z in range(game.d):
+                color = game.b.cell(x, y, z)
+                if color is None:
+                    break
+                pos.masks[game.players.index(color)] |= \
+                    1 << cell_bit(game.d, x, y, z)
+                pos.heights[x*game.d + y] += 1
+                pos.ply += 1
+        return pos
+
+    def copy(self):
+        pos = self.__class__(self.d)
+        pos.masks = self.masks[:]
+        pos.heights = self.heights[:]
+        pos.ply = self.ply
+        pos.moves = self.moves[:]
+        return pos
+
+    @property
+    def turn(self):
+        return self.ply % 2
+
+    def legal_poles(self):
+        return [p for p, h in enumerate(self.heights) if h < self.d]
+
+    def is_full(self):
+        return self.ply == self.n_cells
+
+    def play(self, pole):
+        # returns True when the move completes a line
+        cell = pole*self.d + self.heights[pole]
+        self.heights[pole] += 1
+        mask = self.masks[self.ply % 2] | 1 << cell
+        self.masks[self.ply % 2] = mask
+        self.ply += 1
+        self.moves.append(pole)
+        for line in self.cell_masks[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+    def undo(self):
+        pole = self.moves.pop()
+        self.ply -= 1
+        self.heights[pole] -= 1
+        self.masks[self.ply % 2] &= \
+            ~(1 << (pole*self.d + self.heights[pole]))
+        return pole
+
+    def wins_at(self, pole, player):
+        h = self.heights[pole]
+        if h >= self.d:
+            return False
+        cell = pole*self.d + h
+        mask = self.masks[player] | 1 << cell
+        for line in self.cell_masks[cell]:
+            if mask & line == line:
+                return True
+        return False
+
+    def canonical(self):
+        # (key, sym): key is the smallest image of the position, sym the
+        # index of the symmetry in gravity_symmetries producing it
+        m0, m1 = self.masks
+        best, best_sym = None, 0
+        for s, perm in enumerate(gravity_symmetries(self.d)):
+            key = (transform(m0, perm, self.d),
+                   transform(m1, perm, self.d))
+            if best is None or key < best:
+                best, best_sym = key, s
+        return best, best_sym
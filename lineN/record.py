@@ -0,0 +1,129 @@
+from collections import namedtuple
+import json
+import mmap
+import os
+import struct
+
+from lineN import Game
+from lines import flat_index
+
+
+# File layout (little-endian):
+#   header : magic b"LNGR", version, dim, length of the players JSON,
+#            then the players JSON (a list of the two player names)
+#   records: appended one after another; each is
+#            result uint8, number of moves uint16, then one byte per move
+#            holding the pole index x*dim + y
+HEADER = struct.Struct("<4sBBH")
+MAGIC = b"LNGR"
+VERSION = 1
+RECORD = struct.Struct("<BH")
+FIRST, SECOND, DRAW, UNFINISHED = 0, 1, 2, 3
+
+GameRecord = namedtuple("GameRecord", ["result", "moves"])
+
+
+def game_result(game):
+    if game.winner is not None:
+        return game.players.index(game.winner)
+    if len(game.moves) == game.d**game.n:
+        return DRAW
+    return UNFINISHED
+
+
+def read_header(f, path):
+    magic, version, dim, n = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise Exception(
+            "{} is not a lineN record file (version {}).".format(
+                path, VERSION))
+    return dim, json.loads(f.read(n).decode())
+
+
+class RecordWriter(object):
+    def __init__(self, path, dim, players=("BB", "WW")):
+        if dim*dim > 256:
+            raise Exception("Poles do not fit in a byte for dim > 16.")
+        self.d = dim
+        self.players = list(players)
+        self.f = open(path, "ab+")
+        if self.f.tell() == 0:
+            names = json.dumps([str(p) for p in players]).encode()
+            self.f.write(HEADER.pack(MAGIC, VERSION, dim, len(names)))
+            self.f.write(names)
+        else:
+            self.f.seek(0)
+            if read_header(self.f, path)[0] != dim:
+                raise Exception(
+                    "{} holds games of another dim.".format(path))
+            self.f.seek(0, os.SEEK_END)
+
+    def write(self, poles, result):
+        self.f.write(RECORD.pack(result, len(poles)))
+        self.f.write(bytes(poles))
+
+    def write_game(self, game):
+        # files hold 3-D games of their dim, lines being dim stones long
+        if game.d != self.d or game.n != 3 or game.k not in (None, game.d):
+            raise Exception(
+                "A dim={} record file cannot hold a game with dim={}, "
+                "ndim={}, k={}.".format(self.d, game.d, game.n, game.k))
+        self.write(
+            [flat_index(position[:-1], self.d)
+             for position, _ in game.moves],
+            game_result(game))
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordReader(object):
+    # Iterates GameRecord(result, moves) without loading the file;
+    # moves is a bytes object of pole indices. With use_mmap the records
+    # are read from a read-only mapping instead of a buffered file.
+    def __init__(self, path, use_mmap=False):
+        self.path = path
+        self.use_mmap = use_mmap
+        with open(path, "rb") as f:
+            self.d, self.players = read_header(f, path)
+            self.start = f.tell()
+
+    def __iter__(self):
+        if self.use_mmap:
+            return self.iter_mmap()
+        return self.iter_file()
+
+    def iter_file(self):
+        with open(self.path, "rb", buffering=1 << 20) as f:
+            f.seek(self.start)
+            while True:
+                head = f.read(RECORD.size)
+                if len(head) < RECORD.size:
+                    return
+                result, n = RECORD.unpack(head)
+                yield GameRecord(result, f.read(n))
+
+    def iter_mmap(self):
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == self.start:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos, end = self.start, len(mm)
+                while pos + RECORD.size <= end:
+                    result, n = RECORD.unpack_from(mm, pos)
+                    pos += RECORD.size
+                    yield GameRecord(result, mm[pos:pos + n])
+                    pos += n
+
+    def replay(self, record, game_class=Game):
+        game = game_class(dim=self.d, player1=self.players[0],
+                          player2=self.players[1], disp=False)
+        for pole in record.moves:
+            game.put_stone(*divmod(pole, self.d))
+        return game
@@ -0,0 +1,98 @@
+from io import StringIO
+from itertools import product
+
+
+# Renderers turn a board into text through a cell getter,
+# cell(*position) -> player or None, so they work with any board class.
+# Layers are written from the top (last, gravity axis) down; inside a
+# layer every row is one value of the middle coordinates (y on a 3-D
+# board, from high to low) and every column one value of x.
+
+
+class TextRenderer(object):
+    empty = "."
+
+    def __init__(self, dim, ndim=3, players=()):
+        self.d = dim
+        self.n = ndim
+        self.players = list(players)
+        self.width = max(
+            [len(self.empty)] + [len(str(p)) for p in players])
+        self.buf = StringIO()
+        self.rows = list(product(range(dim-1, -1, -1), repeat=ndim-2))
+
+    def token(self, color):
+        text = self.empty if color is None else str(color)
+        return text.ljust(self.width)
+
+    def touch(self, pole):
+        pass
+
+    def render(self, cell):
+        buf = self.buf
+        buf.seek(0)
+        buf.truncate()
+        for z in range(self.d-1, -1, -1):
+            for row in self.rows:
+                buf.write(" ".join(
+                    self.token(cell(x, *row, z)) for x in range(self.d)))
+                buf.write("\n")
+            if z:
+                buf.write("\n")
+        return buf.getvalue().rstrip("\n")
+
+
+class AnsiRenderer(TextRenderer):
+    colors = ("1;31", "1;34", "1;32", "1;33")
+    empty_color = "2"
+
+    def token(self, color):
+        text = super().token(color)
+        if color is None:
+            code = self.empty_color
+        elif color in self.players:
+            code = self.colors[self.players.index(color) % len(self.colors)]
+        else:
+            return text
+        return "\x1b[{}m{}\x1b[0m".format(code, text)
+
+
+class IncrementalRenderer(TextRenderer):
+    # Keeps the rendered text as a list of pieces; after the first render
+    # only the poles reported through touch() are formatted again.
+    def __init__(self, dim, ndim=3, players=()):
+        super().__init__(dim, ndim, players)
+        self.parts = None
+        self.index = {}
+        self.dirty = set()
+
+    def touch(self, pole):
+        self.dirty.add(tuple(pole))
+
+    def render(self, cell):
+        if self.parts is None:
+            self.build(cell)
+        else:
+            for pole in self.dirty:
+                for z, i in enumerate(self.index[pole]):
+                    self.parts[i] = self.token(cell(*pole, z))
+        self.dirty.clear()
+        return "".join(self.parts)
+
+    def build(self, cell):
+        parts = []
+        self.index = {}
+        for z in range(self.d-1, -1, -1):
+            for row in self.rows:
+                for x in range(self.d):
+                    if x:
+                        parts.append(" ")
+                    pole = (x,) + row
+                    self.index.setdefault(pole, [None]*self.d)[z] = \
+                        len(parts)
+                    parts.append(self.token(cell(*pole, z)))
+                parts.append("\n")
+            if z:
+                parts.append("\n")
+        parts.pop()
+        self.parts = parts
@@ -0,0 +1,86 @@
+from multiprocessing import Pool
+import os
+import random
+import sys
+import time
+
+from incremental import IncrementalGame
+from playout import playout, random_policy
+
+
+def chunk_rng(seed, chunk):
+    # one stream per chunk (not per worker), so the result does not
+    # depend on how the chunks are spread over the pool
+    return random.Random("{}:{}".format(seed, chunk))
+
+
+def play_random_game(g, rng):
+    g.restart_game()
+    return playout(g, random_policy, rng)
+
+
+def run_chunk(args):
+    dim, seed, chunk, n_games, game_class = args
+    rng = chunk_rng(seed, chunk)
+    g = game_class(dim=dim, disp=False, player1=0, player2=1)
+    win_num = [0, 0, 0]
+    for _ in range(n_games):
+        winner = play_random_game(g, rng)
+        win_num[2 if winner is None else winner] += 1
+    return n_games, win_num
+
+
+def run(n_games, dim=3, seed=0, workers=None, chunk_size=1000,
+        game_class=IncrementalGame, progress=True):
+    tasks = [
+        (dim, seed, chunk, min(chunk_size, n_games - start), game_class)
+        for chunk, start in enumerate(range(0, n_games, chunk_size))]
+    win_num = [0, 0, 0]
+    done = 0
+    start_time = time.time()
+    last_report = start_time
+
+    def report():
+        elapsed = time.time() - start_time
+        print("{}/{} games ({:.1f}%), {:.0f} games/s".format(
+            done, n_games, 100*done/max(n_games, 1),
+            done/max(elapsed, 1e-9)), file=sys.stderr)
+
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1:
+        results = map(run_chunk, tasks)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap_unordered(run_chunk, tasks)
+
+    try:
+        for chunk_games, counts in results:
+            for n in range(3):
+                win_num[n] += counts[n]
+            done += chunk_games
+            if progress and time.time() - last_report >= 1.0:
+                report()
+                last_report = time.time()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if progress:
+        report()
+    return {
+        "win_num": win_num[:2],
+        "draw_num": win_num[2],
+        "seconds": time.time() - start_time,
+    }
+
+
+if __name__ == "__main__":
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    result = run(n_games, dim=3, seed=seed)
+    win_num = result["win_num"]
+    print(win_num, "draw={}".format(result["draw_num"]))
+    print("{}%".format(100*win_num[0]/max(sum(win_num), 1)))
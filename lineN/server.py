@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from incremental import IncrementalGame
+
+
+# Line-delimited JSON over a local TCP or unix socket.
+#
+# requests (each answered by {"ok": true, "op": ..., ...} or
+# {"ok": false, "op": ..., "error": ...}):
+#   {"op": "new", "dim": 4, "timeout": 30}   -> {"match": id}
+#   {"op": "join", "match": id}              -> {"player": 0 or 1}
+#   {"op": "watch", "match": id}             -> {"state": {...}}
+#   {"op": "state", "match": id}             -> {"state": {...}}
+#   {"op": "move", "match": id, "x": x, "y": y}
+# events sent to both players and all spectators of a match:
+#   {"event": "start", "match": id, "next": 0}
+#   {"event": "move", "match": id, "player": p, "x": x, "y": y, "z": z,
+#    "next": 0 or 1 or null}
+#   {"event": "end", "match": id, "winner": 0 or 1 or null,
+#    "reason": "line" or "draw" or "timeout" or "disconnect" or
+#    "abandoned"}
+# A match nobody has started is dropped ("abandoned") once its creator
+# and everyone who joined it have disconnected.
+
+
+class Match(object):
+    def __init__(self, match_id, dim, timeout, creator=None):
+        self.id = match_id
+        self.creator = creator
+        self.game = IncrementalGame(dim=dim, disp=False,
+                                    player1=0, player2=1)
+        self.timeout = timeout
+        self.players = {}
+        self.spectators = set()
+        self.started = False
+        self.finished = False
+        self.winner = None
+        self.reason = None
+        self.timer = None
+
+    def state(self):
+        return {
+            "match": self.id,
+            "dim": self.game.d,
+            "players": sorted(self.players),
+            "moves": [list(p[:2]) for p, _ in self.game.moves],
+            "next": None if self.finished else self.game.turn,
+            "finished": self.finished,
+            "winner": self.winner,
+            "reason": self.reason,
+        }
+
+    def audience(self):
+        return list(self.players.values()) + list(self.spectators)
+
+
+class Connection(object):
+    def __init__(self, writer):
+        self.writer = writer
+        self.matches = set()
+
+    def send(self, message):
+        self.writer.write(
+            json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class MatchServer(object):
+    def __init__(self, default_timeout=30.0):
+        self.default_timeout = default_timeout
+        self.matches = {}
+        self.ids = itertools.count(1)
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        if path is not None:
+            self.server = await asyncio.start_unix_server(
+                self.handle, path=path)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle, host, port)
+        return self.server
+
+    def address(self):
+        return self.server.sockets[0].getsockname()
+
+    async def close(self):
+        for match in self.matches.values():
+            if match.timer is not None:
+                match.timer.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        conn = Connection(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # longer than the stream limit; the buffer is dropped
+                    conn.send({"ok": False, "op": None,
+                               "error": "request too long"})
+                    await writer.drain()
+                    continue
+                if not line:
+                    break
+                conn.send(self.dispatch(conn, line))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.disconnect(conn)
+            writer.close()
+
+    def dispatch(self, conn, line):
+        try:
+            request = json.loads(line)
+            op = request["op"]
+            handler = getattr(self, "op_" + op)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {"ok": False, "op": None, "error": "bad request"}
+        try:
+            reply = handler(conn, request)
+        except RequestError as e:
+            return {"ok": False, "op": op, "error": str(e)}
+        except Exception:
+            # a bug or an input no check foresaw; the connection stays
+            return {"ok": False, "op": op, "error": "server error"}
+        reply.update(ok=True, op=op)
+        return reply
+
+    def get_match(self, request):
+        match_id = request.get("match")
+        if not isinstance(match_id, int) or isinstance(match_id, bool):
+            raise RequestError("match should be an integer")
+        match = self.matches.get(match_id)
+        if match is None:
+            raise RequestError("no such match")
+        return match
+
+    def op_new(self, conn, request):
+        dim = request.get("dim", 4)
+        timeout = request.get("timeout", self.default_timeout)
+        if not isinstance(dim, int) or not 2 <= dim <= 16:
+            raise RequestError("dim should be an integer in 2-16")
+        if timeout is not None and (
+                isinstance(timeout, bool)
+                or not isinstance(timeout, (int, float))
+                or not 0 <= timeout < float("inf")):
+            raise RequestError(
+                "timeout should be a non-negative number or null")
+        match = Match(next(self.ids), dim, timeout, conn)
+        self.matches[match.id] = match
+        conn.matches.add(match.id)
+        return {"match": match.id}
+
+    def op_join(self, conn, request):
+        match = self.get_match(request)
+        if match.started or match.finished:
+            raise RequestError("match has already started")
+        if conn in match.players.values():
+            raise RequestError("already joined")
+        if len(match.players) == 2:
+            raise RequestError("match is full")
+        player = 0 if 0 not in match.players else 1
+        match.players[player] = conn
+        conn.matches.add(match.id)
+        if len(match.players) == 2:
+            # sent after the join reply has been queued
+            asyncio.get_running_loop().call_soon(self.start_match, match)
+        return {"match": match.id, "player": player}
+
+    def op_watch(self, conn, request):
+        match = self.get_match(request)
+        match.spectators.add(conn)
+        conn.matches.add(match.id)
+        return {"state": match.state()}
+
+    def op_state(self, conn, request):
+        return {"state": self.get_match(request).state()}
+
+    def op_move(self, conn, request):
+        match = self.get_match(request)
+        g = match.game
+        if not match.started or match.finished:
+            raise RequestError("match is not in progress")
+        if match.players.get(g.turn) is not conn:
+            raise RequestError("not your turn")
+        x, y = request.get("x"), request.get("y")
+        if not all(isinstance(c, int) and 0 <= c < g.d for c in (x, y)):
+            raise RequestError(
+                "position should be included in 0-{}".format(g.d-1))
+        if g.b.board[x][y][-1] is not None:
+            raise RequestError("pole is full")
+
+        player = g.turn
+        g.put_stone(x, y)
+        z = g.moves[-1][0][2]
+        if g.finished:
+            self.end_match(match, g.winner, "line", notify=False)
+        elif len(g.moves) == g.d**3:
+            self.end_match(match, None, "draw", notify=False)
+        else:
+            self.arm_timer(match)
+        self.broadcast(match, {
+            "event": "move", "match": match.id, "player": player,
+            "x": x, "y": y, "z": z,
+            "next": None if match.finished else g.turn})
+        if match.finished:
+            self.send_end(match)
+        return {"match": match.id}
+
+    def start_match(self, match):
+        match.started = True
+        self.broadcast(match, {
+            "event": "start", "match": match.id, "next": match.game.turn})
+        self.arm_timer(match)
+
+    def arm_timer(self, match):
+        if match.timer is not None:
+            match.timer.cancel()
+        if match.timeout:
+            match.timer = asyncio.get_running_loop().call_later(
+                match.timeout, self.time_up, match)
+
+    def time_up(self, match):
+        if not match.finished:
+            self.end_match(match, 1 - match.game.turn, "timeout")
+
+    def end_match(self, match, winner, reason, notify=True):
+        match.finished = True
+        match.winner = winner
+        match.reason = reason
+        if match.timer is not None:
+            match.timer.cancel()
+            match.timer = None
+        if notify:
+            self.send_end(match)
+
+    def send_end(self, match):
+        self.broadcast(match, {
+            "event": "end", "match": match.id, "winner": match.winner,
+            "reason": match.reason})
+        # finished matches are kept only while someone still follows them
+        if not match.audience():
+            self.matches.pop(match.id, None)
+
+    def broadcast(self, match, message):
+        for conn in match.audience():
+            try:
+                conn.send(message)
+            except (ConnectionError, RuntimeError):
+                pass
+
+    def disconnect(self, conn):
+        for match_id in conn.matches:
+            match = self.matches.get(match_id)
+            if match is None:
+                continue
+            match.spectators.discard(conn)
+            if match.creator is conn:
+                match.creator = None
+            for player, c in list(match.players.items()):
+                if c is conn:
+                    del match.players[player]
+                    if match.started and not match.finished:
+                        self.end_match(match, 1 - player, "disconnect")
+            if not match.started and not match.players and \
+                    match.creator is None:
+                self.end_match(match, None, "abandoned")
+                self.matches.pop(match_id, None)
+            elif match.finished and not match.audience():
+                self.matches.pop(match_id, None)
+
+
+class RequestError(Exception):
+    pass
+
+
+async def simulated_player(connection, match_id, dim, rng, latencies):
+    # Joins a match and plays random legal moves until the "end" event,
+    # which it returns.
+    reader, writer = connection
+
+    async def request(message):
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    await request({"op": "join", "match": match_id})
+    me = json.loads(await reader.readline())["player"]
+    heights = [[0]*dim for _ in range(dim)]
+    sent = None
+    try:
+        while True:
+            message = json.loads(await reader.readline())
+            event = message.get("event")
+            if event == "move":
+                heights[message["x"]][message["y"]] += 1
+                if message["player"] == me and sent is not None:
+                    latencies.append(time.perf_counter() - sent)
+            if event == "end":
+                return message
+            if event in ("start", "move") and message["next"] == me:
+                poles = [(x, y) for x in range(dim) for y in range(dim)
+                         if heights[x][y] < dim]
+                x, y = rng.choice(poles)
+                sent = time.perf_counter()
+                await request({"op": "move", "match": match_id,
+                               "x": x, "y": y})
+    finally:
+        writer.close()
+
+
+async def simulate(connect, n_matches, dim=4, seed=0, concurrency=None):
+    # Local client simulator: n_matches random games, two clients each,
+    # at most `concurrency` matches at a time.
+    rng = random.Random(seed)
+    latencies = []
+    results = {0: 0, 1: 0, None: 0}
+    semaphore = asyncio.Semaphore(concurrency or n_matches)
+
+    async def one_match(seeds):
+        async with semaphore:
+            first = await connect()
+            first[1].write(json.dumps(
+                {"op": "new", "dim": dim}).encode() + b"\n")
+            match_id = json.loads(await first[0].readline())["match"]
+            second = await connect()
+            end, _ = await asyncio.gather(*(
+                simulated_player(c, match_id, dim, random.Random(s),
+                                 latencies)
+                for c, s in zip((first, second), seeds)))
+            results[end["winner"]] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        one_match((rng.getrandbits(64), rng.getrandbits(64)))
+        for _ in range(n_matches)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "matches": n_matches,
+        "wins": [results[0], results[1]],
+        "draws": results[None],
+        "seconds": elapsed,
+        "moves": len(latencies),
+        "moves_per_second": len(latencies)/elapsed,
+        "latency_p50": latencies[len(latencies)//2] if latencies else None,
+        "latency_p99":
+            latencies[int(len(latencies)*0.99)] if latencies else None,
+    }
+
+
+async def run_simulation(args):
+    server = MatchServer()
+    if args.unix:
+        await server.start(path=args.unix)
+        connect = lambda: asyncio.open_unix_connection(args.unix)
+    else:
+        await server.start(args.host, 0)
+        host, port = server.address()[:2]
+        connect = lambda: asyncio.open_connection(host, port)
+    try:
+        result = await simulate(connect, args.matches, args.dim, args.seed,
+                                args.concurrency)
+    finally:
+        await server.close()
+    for key, value in result.items():
+        print("{}: {}".format(key, value))
+
+
+async def serve(args):
+    server = MatchServer(args.timeout)
+    await server.start(args.host, args.port, args.unix)
+    print("serving on {}".format(args.unix or server.address()))
+    async with server.server:
+        await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Host lineN matches over line-delimited JSON.")
+    parser.add_argument("mode", choices=["serve", "simulate"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on a unix socket instead")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--dim", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.mode == "serve":
+        asyncio.run(serve(args))
+    else:
+        asyncio.run(run_simulation(args))
@@ -0,0 +1,189 @@
+import time
+
+from position import (
+    Position, gravity_symmetries, inverse_symmetries, pole_order)
+
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable(object):
+    # Fixed number of slots indexed by the key's hash. A slot is
+    # overwritten by the same position, or by a search at least as deep
+    # (depth-preferred replacement), so the table never grows.
+    def __init__(self, size=1 << 20):
+        self.size = size
+        self.slots = [None]*size
+        self.stored = 0
+
+    def probe(self, key):
+        entry = self.slots[hash(key) % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, value, move):
+        n = hash(key) % self.size
+        old = self.slots[n]
+        if old is None:
+            self.stored += 1
+        elif old[0] != key and old[1] > depth:
+            return
+        self.slots[n] = (key, depth, flag, value, move)
+
+
+class TimeUp(Exception):
+    pass
+
+
+class Solver(object):
+    def __init__(self, dim, tt_size=1 << 20, book=None):
+        if book is not None and book.d != dim:
+            raise Exception(
+                "The book holds dim={} positions, not dim={}.".format(
+                    book.d, dim))
+        self.d = dim
+        self.tt = TranspositionTable(tt_size)
+        self.book = book
+        self.syms = gravity_symmetries(dim)
+        self.inv_syms = inverse_symmetries(dim)
+        self.order = pole_order(dim)
+        self.win = dim**3 + 1
+        self.nodes = 0
+        self.deadline = None
+
+    def win_score(self, pos):
+        # the side that just moved at ply `pos.ply` won; sooner is better
+        return self.win - pos.ply
+
+    def ordered_poles(self, pos, first=None):
+        poles = [p for p in self.order if pos.heights[p] < self.d]
+        if first is not None and first in poles:
+            poles.remove(first)
+            poles.insert(0, first)
+        return poles
+
+    def negamax(self, pos, depth, alpha, beta):
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 4096 == 0 \
+                and time.time() > self.deadline:
+            raise TimeUp()
+        if pos.is_full():
+            return 0
+        player = pos.turn
+        for pole in self.order:
+            if pos.wins_at(pole, player):
+                return self.win_score(pos) - 1
+        if depth == 0:
+            return 0
+
+        alpha_orig = alpha
+        key, sym = pos.canonical()
+        if self.book is not None:
+            entry = self.book.lookup(key)
+            if entry is not None and entry[2] >= depth:
+                return entry[0]
+        entry = self.tt.probe(key)
+        first = None
+        if entry is not None:
+            _, e_depth, flag, value, move = entry
+            if e_depth >= depth:
+                if flag == EXACT:
+                    return value
+                elif flag == LOWER:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    return value
+            if move is not None:
+                first = self.inv_syms[sym][move]
+
+        best, best_pole = -self.win, None
+        for pole in self.ordered_poles(pos, first):
+            pos.play(pole)
+            value = -self.negamax(pos, depth-1, -beta, -alpha)
+            pos.undo()
+            if value > best:
+                best, best_pole = value, pole
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, best, self.syms[sym][best_pole])
+        return best
+
+    def search_root(self, pos, depth, first=None):
+        player = pos.turn
+        for pole in self.order:
+            if pos.wins_at(pole, player):
+                return self.win_score(pos) - 1, pole
+        alpha, beta = -self.win, self.win
+        best, best_pole = -self.win, None
+        for pole in self.ordered_poles(pos, first):
+            pos.play(pole)
+            value = -self.negamax(pos, depth-1, -beta, -alpha)
+            pos.undo()
+            if value > best:
+                best, best_pole = value, pole
+            alpha = max(alpha, value)
+        key, sym = pos.canonical()
+        self.tt.store(key, depth, EXACT, best, self.syms[sym][best_pole])
+        return best, best_pole
+
+    def solve(self, pos, max_depth=None, time_limit=None):
+        # Iterative deepening. Returns (value, pole, depth) of the deepest
+        # completed iteration; value > 0 means the side to move wins,
+        # < 0 that it loses, 0 a draw or no result within the depth.
+        remaining = pos.n_cells - pos.ply
+        if max_depth is None or max_depth > remaining:
+            max_depth = remaining
+        self.deadline = None if time_limit is None \
+            else time.time() + time_limit
+        result = (0, None, 0)
+        root_ply = pos.ply
+        try:
+            for depth in range(1, max_depth + 1):
+                value, pole = self.search_root(pos, depth, result[1])
+                result = (value, pole, depth)
+                if value != 0:
+                    break
+        except TimeUp:
+            while pos.ply > root_ply:
+                pos.undo()
+        finally:
+            self.deadline = None
+        return result
+
+    def export_book(self, writer):
+        # exact results only; bounds are meaningless outside this search
+        for entry in self.tt.slots:
+            if entry is not None and entry[2] == EXACT:
+                key, depth, _, value, move = entry
+                writer.add(key, value, move, depth)
+
+    def best_move(self, game, max_depth=None, time_limit=None):
+        pos = Position.from_game(game)
+        _, pole, _ = self.solve(pos, max_depth, time_limit)
+        if pole is None:
+            return None
+        return divmod(pole, self.d)
+
+
+if __name__ == "__main__":
+    import sys
+    dim = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    time_limit = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    solver = Solver(dim)
+    start = time.time()
+    value, pole, depth = solver.solve(Position(dim), time_limit=time_limit)
+    print("dim={} value={} pole={} depth={}".format(
+        dim, value, pole, depth))
+    print("{} nodes, {:.1f}s, {} table entries".format(
+        solver.nodes, time.time() - start, solver.tt.stored))
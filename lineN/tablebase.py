@@ -0,0 +1,240 @@
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from position import Position, cell_line_masks, gravity_symmetries
+
+
+# Complete win/loss/draw table of the positions reachable on a board of
+# up to 3x3x3, so that both masks fit one 64-bit key:
+# key = m0 | m1 << n_cells (first player's stones in the low half).
+#
+# Stones never leave the board, so rather than un-moving from the final
+# positions the reachable non-terminal positions are enumerated layer by
+# layer (one layer per stone count, one image per symmetry class), then
+# valued from the last layer back to the empty board.
+#
+# File layout (little-endian):
+#   header : magic b"LNTB", version, dim, number of positions n, padded
+#            to KEYS_OFFSET bytes
+#   keys   : the n canonical keys of the reachable positions with no
+#            line, sorted, as uint64; a key's place here is its rank
+#   values : 2 bits per rank, four to a byte, lowest bits first
+# Lookups take the canonical form of a key and binary-search the keys,
+# so the file holds each symmetry class once and nothing unreachable.
+HEADER = struct.Struct("<4sBBQ")
+KEYS_OFFSET = 16
+MAGIC = b"LNTB"
+VERSION = 2
+# for the side to move; UNKNOWN is every position that is not reachable
+# or already has a line on the board
+UNKNOWN, WIN, LOSS, DRAW = 0, 1, 2, 3
+CODES = np.array([LOSS, DRAW, WIN], dtype=np.uint8)
+
+
+def transform_keys(keys, perm, dim):
+    n_cells = dim**3
+    column = np.uint64(((1 << dim) - 1) * (1 | 1 << n_cells))
+    new = np.zeros_like(keys)
+    for p, q in enumerate(perm):
+        new |= ((keys >> np.uint64(p*dim)) & column) << np.uint64(q*dim)
+    return new
+
+
+def canonical_keys(keys, dim):
+    best = None
+    for perm in gravity_symmetries(dim):
+        new = transform_keys(keys, perm, dim)
+        best = new if best is None else np.minimum(best, new)
+    return best
+
+
+def expand(keys, ply, dim):
+    # Children of keys with `ply` stones, one row per pole: the canonical
+    # child keys, and state -1 where the pole is full, 1 where the move
+    # completes a line and 0 otherwise.
+    n_cells, n_poles = dim**3, dim*dim
+    shift = np.uint64(n_cells*(ply % 2))
+    column = np.uint64((1 << dim) - 1)
+    occupied = (keys | keys >> np.uint64(n_cells)) & \
+        np.uint64((1 << n_cells) - 1)
+    cell_masks = cell_line_masks(dim)
+    child = np.zeros((n_poles, len(keys)), dtype=np.uint64)
+    state = np.full((n_poles, len(keys)), -1, dtype=np.int8)
+    for pole in range(n_poles):
+        heights = (occupied >> np.uint64(pole*dim)) & column
+        for h in range(dim):
+            sel = np.flatnonzero(heights == np.uint64((1 << h) - 1))
+            if len(sel) == 0:
+                continue
+            cell = pole*dim + h
+            new = keys[sel] | np.uint64(1 << cell) << shift
+            mine = new >> shift
+            won = np.zeros(len(sel), dtype=bool)
+            for line in cell_masks[cell]:
+                line = np.uint64(line)
+                won |= (mine & line) == line
+            child[pole, sel] = new
+            state[pole, sel] = won
+    return canonical_keys(child.ravel(), dim).reshape(child.shape), state
+
+
+def chunks(array, size):
+    for start in range(0, len(array), size):
+        yield array[start:start + size]
+
+
+def enumerate_layers(dim, chunk_size=1 << 20, report=None):
+    # layers[s]: sorted canonical keys of the reachable positions with s
+    # stones and no line yet
+    layers = [np.zeros(1, dtype=np.uint64)]
+    start = time.time()
+    for ply in range(dim**3):
+        parts = [np.zeros(0, dtype=np.uint64)]
+        for keys in chunks(layers[-1], chunk_size):
+            child, state = expand(keys, ply, dim)
+            parts.append(np.unique(child[state == 0]))
+        layers.append(np.unique(np.concatenate(parts)))
+        if report is not None:
+            report("enumerate", ply + 1, len(layers[-1]), time.time() - start)
+    return layers
+
+
+def solve_layers(layers, dim, chunk_size=1 << 20, report=None):
+    # values[s][i]: 1, 0 or -1 as the side to move in layers[s][i] wins,
+    # draws or loses; a full board is a draw
+    values = [None]*len(layers)
+    values[-1] = np.zeros(len(layers[-1]), dtype=np.int8)
+    start = time.time()
+    for ply in range(len(layers) - 2, -1, -1):
+        parts = [np.zeros(0, dtype=np.int8)]
+        for keys in chunks(layers[ply], chunk_size):
+            child, state = expand(keys, ply, dim)
+            v = np.full(child.shape, -2, dtype=np.int8)
+            v[state == 1] = 1
+            going = state == 0
+            found = np.searchsorted(layers[ply + 1], child[going])
+            v[going] = -values[ply + 1][found]
+            parts.append(v.max(axis=0))
+        values[ply] = np.concatenate(parts)
+        if report is not None:
+            report("solve", ply, len(layers[ply]), time.time() - start)
+    return values
+
+
+def pack_codes(codes):
+    # four 2-bit codes to a byte, the first in the lowest bits
+    codes = np.concatenate(
+        (codes, np.zeros(-len(codes) % 4, dtype=np.uint8))).reshape(-1, 4)
+    return codes[:, 0] | codes[:, 1] << 2 | codes[:, 2] << 4 | \
+        codes[:, 3] << 6
+
+
+def build(path, dim=3, chunk_size=1 << 20, report=None):
+    if 2*dim**3 > 64:
+        raise Exception("Tablebases only fit boards up to 3x3x3.")
+    layers = enumerate_layers(dim, chunk_size, report)
+    values = solve_layers(layers, dim, chunk_size, report)
+    # layers differ in stone count, so no key is in two of them
+    keys = np.concatenate(layers)
+    order = np.argsort(keys)
+    keys = keys[order]
+    codes = CODES[np.concatenate(values)[order] + 1]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, dim, len(keys)).ljust(
+            KEYS_OFFSET, b"\0"))
+        f.write(keys.astype("<u8").tobytes())
+        f.write(pack_codes(codes).tobytes())
+    os.replace(tmp_path, path)
+    return int(values[0][0])
+
+
+class Tablebase(object):
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dim, size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception(
+                "{} is not a lineN tablebase (version {}).".format(
+                    path, VERSION))
+        self.d = dim
+        self.size = size
+        self.n_cells = dim**3
+        self.keys = np.frombuffer(self.mm, dtype="<u8", count=size,
+                                  offset=KEYS_OFFSET)
+        self.values = np.frombuffer(self.mm, dtype=np.uint8,
+                                    count=(size + 3)//4,
+                                    offset=KEYS_OFFSET + 8*size)
+
+    def lookup(self, keys):
+        # codes for an array of keys, in any of their symmetric images
+        keys = canonical_keys(np.asarray(keys, dtype=np.uint64), self.d)
+        rank = np.minimum(np.searchsorted(self.keys, keys), self.size - 1)
+        shift = ((rank & 3)*2).astype(np.uint8)
+        codes = (self.values[rank >> 2] >> shift) & 3
+        return np.where(self.keys[rank] == keys, codes, UNKNOWN).tolist()
+
+    def probe(self, pos):
+        m0, m1 = pos.masks
+        return self.lookup([m0 | m1 << self.n_cells])[0]
+
+    def best_pole(self, pos):
+        # a winning move if there is one, else a drawing one, else any;
+        # None once the board is full
+        poles = pos.legal_poles()
+        for pole in poles:
+            if pos.wins_at(pole, pos.turn):
+                return pole
+        keys = []
+        for pole in poles:
+            child = pos.copy()
+            child.play(pole)
+            keys.append(child.masks[0] | child.masks[1] << self.n_cells)
+        if not keys:
+            return None
+        # the opponent moves next: their loss is our win
+        preference = {LOSS: 0, DRAW: 1, WIN: 2, UNKNOWN: 3}
+        codes = self.lookup(keys)
+        return min(zip(poles, codes), key=lambda pc: preference[pc[1]])[0]
+
+    def best_move(self, game):
+        pole = self.best_pole(Position.from_game(game))
+        if pole is None:
+            return None
+        return divmod(pole, self.d)
+
+    def close(self):
+        # the arrays are views of the mapping and must go first
+        del self.keys, self.values
+        self.mm.close()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python tablebase.py <path> [dim]: builds the table for <path>
+    path = sys.argv[1]
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    def report(stage, ply, n, seconds):
+        print("{:9s} ply {:2d}: {:>10,} positions {:7.1f}s".format(
+            stage, ply, n, seconds), flush=True)
+
+    value = build(path, dim, report=report)
+    print("first player {}".format(
+        {1: "wins", 0: "draws", -1: "loses"}[value]))
+    with Tablebase(path) as tb:
+        print("{:,} positions, {:,} bytes".format(
+            tb.size, os.path.getsize(path)))
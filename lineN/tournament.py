@@ -0,0 +1,253 @@
+import argparse
+from multiprocessing import Pool
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from dataset import greedy_policy
+from incremental import IncrementalGame
+from mcts import MCTSPlayer
+from playout import heavy_policy, random_policy
+from runner import chunk_rng
+from solver import Solver
+
+
+# Players are picklable callables player(game, rng) -> (x, y), asked for
+# a move whenever it is their turn; any module-level function of that
+# shape can enter. Engines keeping state between moves (tables, trees)
+# build it lazily in each worker process and leave it out when pickled.
+#
+# Games are scheduled round by round (all pairs, or Swiss pairings by
+# rating), every pairing playing both colours, until each player's Elo
+# confidence interval is narrower than the target.
+
+
+class RandomPlayer(object):
+    def __call__(self, game, rng):
+        return random_policy(game, rng)
+
+
+class HeavyPlayer(object):
+    def __call__(self, game, rng):
+        return heavy_policy(game, rng)
+
+
+class GreedyPlayer(object):
+    def __init__(self, epsilon=0.0):
+        self.epsilon = epsilon
+
+    def __call__(self, game, rng):
+        return greedy_policy(game, rng, self.epsilon)
+
+
+class SolverPlayer(object):
+    def __init__(self, max_depth=None, time_limit=0.05, tt_size=1 << 16):
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.tt_size = tt_size
+        self.solver = None
+
+    def __getstate__(self):
+        return dict(self.__dict__, solver=None)
+
+    def __call__(self, game, rng):
+        if self.solver is None or self.solver.d != game.d:
+            self.solver = Solver(game.d, self.tt_size)
+        move = self.solver.best_move(game, self.max_depth, self.time_limit)
+        return random_policy(game, rng) if move is None else move
+
+
+class MCTSBot(object):
+    def __init__(self, iterations=None, time_limit=0.05, c=1.4):
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.c = c
+        self.mcts = None
+
+    def __getstate__(self):
+        return dict(self.__dict__, mcts=None)
+
+    def __call__(self, game, rng):
+        if self.mcts is None or self.mcts.d != game.d:
+            self.mcts = MCTSPlayer(game.d, self.iterations,
+                                   self.time_limit, self.c)
+        self.mcts.rng.seed(rng.random())
+        return self.mcts.choose(game)
+
+
+BUILTIN = {
+    "random": RandomPlayer,
+    "heavy": HeavyPlayer,
+    "greedy": GreedyPlayer,
+    "solver": SolverPlayer,
+    "mcts": MCTSBot,
+}
+
+players = None
+
+
+def init_worker(entrants):
+    global players
+    players = entrants
+
+
+def play_game(task):
+    # (first, second, score of first): 1 win, 0.5 draw, 0 loss
+    dim, seed, game_id, first, second = task
+    rng = chunk_rng(seed, game_id)
+    g = IncrementalGame(dim=dim, disp=False, player1=0, player2=1)
+    movers = (players[first], players[second])
+    while not g.finished and len(g.moves) < dim**3:
+        g.put_stone(*movers[g.turn](g, rng))
+    score = 0.5 if g.winner is None else 1.0 - g.winner
+    return first, second, score
+
+
+def bradley_terry(points, games, prior=1.0, z=1.96, tol=1e-10):
+    # points[i, j]: what i scored against j (a draw is half a point),
+    # games[i, j]: how many games they played. Fits the strengths with
+    # the minorization-maximization iteration, after adding `prior`
+    # drawn games to every pair that met so that unbeaten players stay
+    # finite. Returns Elo ratings (mean 0) and the half widths of
+    # their z confidence intervals, from the Fisher information.
+    met = games > 0
+    w = points + prior/2*met
+    n = games + prior*met
+    gamma = np.ones(len(w))
+    for _ in range(10000):
+        denom = (n / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+        new = np.where(denom > 0, w.sum(axis=1) / np.maximum(denom, 1e-300),
+                       1.0)
+        new /= np.exp(np.log(new).mean())
+        done = np.abs(new - gamma).max() < tol
+        gamma = new
+        if done:
+            break
+    theta = np.log(gamma)
+    p = 1 / (1 + np.exp(theta[None, :] - theta[:, None]))
+    info = n*p*(1 - p)
+    info = np.diag(info.sum(axis=1)) - info
+    se = np.sqrt(np.maximum(np.diag(np.linalg.pinv(info)), 0))
+    scale = 400 / math.log(10)
+    return theta*scale, z*se*scale
+
+
+def round_robin(n, ratings, last):
+    return [(i, j) for i in range(n) for j in range(i + 1, n)]
+
+
+def swiss(n, ratings, last):
+    # neighbours in the rating order, avoiding last round's opponent
+    # where possible; with an odd count the lowest unpaired sits out
+    order = list(np.argsort(-ratings, kind="stable"))
+    pairs = []
+    while len(order) > 1:
+        i = order.pop(0)
+        j = next((j for j in order if last.get(i) != j), order[0])
+        order.remove(j)
+        pairs.append((i, j))
+    return pairs
+
+
+SCHEDULES = {"round-robin": round_robin, "swiss": swiss}
+
+
+def run(entrants, dim=4, schedule="round-robin", target_width=100.0,
+        min_rounds=2, max_games=100000, seed=0, workers=None,
+        progress=True):
+    # entrants: [(name, player), ...]. Returns a list of rows sorted by
+    # rating: name, elo, ci (half width), games, score.
+    names = [name for name, _ in entrants]
+    n = len(entrants)
+    points = np.zeros((n, n))
+    games = np.zeros((n, n))
+    ratings = np.zeros(n)
+    widths = np.full(n, np.inf)
+    last = {}
+    played = rounds = 0
+    start_time = time.time()
+    if workers is None:
+        workers = os.cpu_count()
+    pool = Pool(workers, init_worker, ([p for _, p in entrants],)) \
+        if workers > 1 else None
+    if pool is None:
+        init_worker([p for _, p in entrants])
+    try:
+        while played < max_games:
+            pairs = SCHEDULES[schedule](n, ratings, last)
+            last = dict(pairs + [(j, i) for i, j in pairs])
+            # enough games per pairing to keep every worker busy
+            repeat = max(1, -(-workers // (2*len(pairs))))
+            tasks = []
+            for i, j in pairs:
+                for _ in range(repeat):
+                    for first, second in ((i, j), (j, i)):
+                        tasks.append((dim, seed, played + len(tasks),
+                                      first, second))
+            results = map(play_game, tasks) if pool is None \
+                else pool.imap_unordered(play_game, tasks)
+            for first, second, score in results:
+                points[first, second] += score
+                points[second, first] += 1 - score
+                games[first, second] += 1
+                games[second, first] += 1
+            played += len(tasks)
+            rounds += 1
+            ratings, half = bradley_terry(points, games)
+            widths = 2*half
+            if progress:
+                print("round {}: {} games, widest interval {:.0f} Elo "
+                      "({:.0f}s)".format(rounds, played, widths.max(),
+                                         time.time() - start_time),
+                      file=sys.stderr)
+            if rounds >= min_rounds and widths.max() <= target_width:
+                break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    table = [
+        {"name": names[i], "elo": ratings[i], "ci": widths[i]/2,
+         "games": int(games[i].sum()),
+         "score": points[i].sum() / max(games[i].sum(), 1)}
+        for i in range(n)]
+    return sorted(table, key=lambda r: -r["elo"])
+
+
+def print_table(table):
+    for r in table:
+        print("{name:16s} {elo:7.0f} +-{ci:4.0f}  {games:6d} games "
+              "{score:6.1%}".format(**r))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rate lineN bots against each other.")
+    parser.add_argument(
+        "players", nargs="+",
+        help="built-in players ({}), as name or name:key=value,...".format(
+            ", ".join(sorted(BUILTIN))))
+    parser.add_argument("--dim", type=int, default=4)
+    parser.add_argument("--schedule", choices=sorted(SCHEDULES),
+                        default="round-robin")
+    parser.add_argument("--target-width", type=float, default=100.0,
+                        help="stop when every 95%% interval is this narrow")
+    parser.add_argument("--max-games", type=int, default=100000)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    entrants = []
+    for spec in args.players:
+        kind, _, params = spec.partition(":")
+        kwargs = {}
+        for item in filter(None, params.split(",")):
+            key, value = item.split("=")
+            kwargs[key] = float(value) if "." in value else int(value)
+        entrants.append((spec, BUILTIN[kind](**kwargs)))
+    print_table(run(entrants, args.dim, args.schedule, args.target_width,
+                    max_games=args.max_games, seed=args.seed,
+                    workers=args.workers))